@@ -1,81 +1,42 @@
+import numpy as np
 import pandas as pd 
 import plotly.graph_objects as go 
 from plotly.subplots import make_subplots
 
+from klines import time_span
+from ledger import TradeLedger
+from engine import Engine, PercentExit
+
+TRADE_KEYS = ('entry_date', 'exit_date', 'period', 'trade_type', 'entry_budget', 'exit_budget', 'profit', 'take_profit', 'stop_loss')
+
+
 class Backtest:
-    def __init__(self, df: pd.DataFrame, initial_budget: float, trade_percentage: float, leverage: int, take_profit: float, stop_loss: float):
+    def __init__(self, df: pd.DataFrame, initial_budget: float, trade_percentage: float, leverage: int, take_profit: float, stop_loss: float, engine: str = 'numpy', fill: str = 'close', resolver=None):
         self.df = df
         self.initial_budget = initial_budget
         self.trade_percentage = trade_percentage
         self.leverage = leverage
         self.take_profit = take_profit
         self.stop_loss = stop_loss
-        self.trades = []
+        self.trades = TradeLedger(df['Open Time'], TRADE_KEYS)
         self.final_budget = initial_budget
+        self.engine = engine  # 'numpy' Engine.simulate or the 'python' reference bar loop, both give the same trades
+        self.fill = fill  # 'level' fills at the level touched, with resolver settling bars that touch both (numpy engine only)
+        self.resolver = resolver
 
     def run(self):
-        budget = self.initial_budget
-        in_position = False
-        entry_price = 0
-        entry_index = 0
-        entry_date = None
-        trade_type = None
-
-        for index, row in self.df.iterrows():
-            if not in_position:
-                if row['signal'] == 1 or row['signal'] == -1:
-                    in_position = True
-                    entry_price = row['Close']
-                    entry_index = index
-                    entry_date = row['Open Time']
-                    trade_type = 'long' if row['signal'] == 1 else 'short'
-                    entry_budget = budget
-            else:
-                if trade_type == 'long':
-                    if row['High'] >= entry_price * (1 + self.take_profit / 100) or row['Low'] <= entry_price * (1 - self.stop_loss / 100):
-                        exit_price = row['Close']
-                        profit = (exit_price - entry_price) * self.leverage * self.trade_percentage * budget / entry_price
-                        budget += profit
-                        exit_budget = budget
-                        in_position = False
-                        self.trades.append({
-                            'entry_date': entry_date,
-                            'exit_date': row['Open Time'],
-                            'period': (row['Open Time'] - entry_date).total_seconds() / 3600,
-                            'trade_type': trade_type,
-                            'entry_budget': entry_budget,
-                            'exit_budget': exit_budget,
-                            'profit': profit,
-                            'take_profit': entry_price * (1 + self.take_profit / 100),
-                            'stop_loss': entry_price * (1 - self.stop_loss / 100)
-                        })
-                if trade_type == 'short':
-                    if row['Low'] <= entry_price * (1 - self.take_profit / 100) or row['High'] >= entry_price * (1 + self.stop_loss / 100):
-                        exit_price = row['Close']
-                        profit = (entry_price - exit_price) * self.leverage * self.trade_percentage * budget / entry_price
-                        budget += profit
-                        exit_budget = budget
-                        in_position = False
-                        self.trades.append({
-                            'entry_date': entry_date,
-                            'exit_date': row['Open Time'],
-                            'period': (row['Open Time'] - entry_date).total_seconds() / 3600,
-                            'trade_type': trade_type,
-                            'entry_budget': entry_budget,
-                            'exit_budget': exit_budget,
-                            'profit': profit,
-                            'take_profit': entry_price * (1 - self.take_profit / 100),
-                            'stop_loss': entry_price * (1 + self.stop_loss / 100)
-                        })
-        self.final_budget = budget
+        engine = Engine(self.df, self.initial_budget, self.trade_percentage, self.leverage, PercentExit(self.take_profit, self.stop_loss), self.fill, TRADE_KEYS, self.resolver)
+        if self.engine == 'python':
+            engine.simulate_bars()
+        else:
+            engine.simulate()
+        self.trades = engine.trades
+        self.final_budget = engine.final_budget
         return self._generate_statistics()
 
     def plot(self):
-        budgets = [self.initial_budget]
+        trades = self.trades.to_frame()
 
-        for trade in self.trades:
-            budgets.append(trade['exit_budget'])
-        
         fig = make_subplots(rows=3, cols=1, shared_xaxes=True,
                             vertical_spacing=0.02,
                             row_heights=[0.2, 0.6, 0.2],
@@ -83,7 +44,7 @@ class Backtest:
                                 [{'type': 'candlestick'}],
                                 [{'type': 'bar'}]])
 
-        fig.add_trace(go.Scatter(x=[trade['exit_date'] for trade in self.trades], y=budgets[1:], mode='lines', name='Budget'), row=1, col=1)
+        fig.add_trace(go.Scatter(x=trades['exit_date'], y=trades['exit_budget'], mode='lines', name='Budget'), row=1, col=1)
 
         fig.add_trace(go.Candlestick(x=self.df['Open Time'],
                                     open=self.df['Open'],
@@ -95,7 +56,7 @@ class Backtest:
         fig.add_trace(go.Scatter(x=self.df['Open Time'], y=self.df['pointpos'], mode='markers',
                         marker=dict(size=10, color='MediumPurple'), name='Signals'), row=2, col=1)
 
-        for trade in self.trades:
+        for trade in trades.to_dict('records'):
             fig.add_shape(type='rect',
                         x0=trade['entry_date'], y0=0, x1=trade['exit_date'], y1=1,
                         xref='x2', yref='paper',
@@ -115,13 +76,13 @@ class Backtest:
             
 
     def _generate_statistics(self):
-        total_signals = len(self.df[self.df['signal'] != 0])
+        total_signals = int((self.df['signal'] != 0).sum())
         amount_trades = len(self.trades)
-        peak_budget = max([trade['exit_budget'] for trade in self.trades] + [self.initial_budget])
+        peak_budget = self.trades.peak_budget(self.initial_budget)
         final_result_percentage = ((self.final_budget - self.initial_budget) / self.initial_budget) * 100
 
         return {
-            'period': self.df['Open Time'].iloc[-1] - self.df['Open Time'].iloc[0],
+            'period': time_span(self.df['Open Time']),
             'start_budget': self.initial_budget,
             'end_budget': self.final_budget,
             'peak_budget': peak_budget,
@@ -133,4 +94,28 @@ class Backtest:
 
                     
 
-    
\ No newline at end of file
+    
+
+def run_grid(df: pd.DataFrame, initial_budget: float, trade_percentage: float, leverage: int, params, signal=None, index=None, fill: str = 'close'):
+    # Every (take_profit, stop_loss) pair of params on the same signals in one pass: Engine.simulate_grid with a
+    # PercentExit of the take / stop arrays, so every row equals Backtest(df, ..., take, stop, fill=fill).run().
+    # params is a list of {'take', 'stop'} dicts or of (take, stop) pairs.
+    # signal replaces df['signal'] and index reuses a TouchIndex of the same bars, for sweeps over many signals.
+    if len(params) > 0 and isinstance(params[0], dict):
+        params = [(param['take'], param['stop']) for param in params]
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 2)
+    take, stop = params[:, 0], params[:, 1]
+
+    engine = Engine(df, initial_budget, trade_percentage, leverage, PercentExit(take, stop), fill, TRADE_KEYS, signal=signal, index=index)
+    budget, peak_budget, amount_trades = engine.simulate_grid(len(params))
+
+    return pd.DataFrame({
+        'take': take,
+        'stop': stop,
+        'start_budget': float(initial_budget),
+        'end_budget': budget,
+        'peak_budget': peak_budget,
+        'final_result_percentage': (budget - initial_budget) / initial_budget * 100,
+        'amount_trades': amount_trades,
+        'total_signals': int(np.count_nonzero(engine.signal != 0)),
+    })
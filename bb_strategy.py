@@ -6,15 +6,33 @@ from plotly.subplots import make_subplots
 
 from bybit import Bybit
 from binance import Binance
-from tqdm import tqdm
 from backtest_gpt4 import Backtest
 from backtest import Backtest as BTest 
+from indicators import REGISTRY
 
-tqdm.pandas()
+
+def trend(fast, slow, backcandles):
+    # For every bar (last axis): 1 if fast was above slow on each of the backcandles bars before it (also when
+    # there is no bar before), -1 if it was below on each of them, otherwise 0
+    end = np.arange(fast.shape[-1])
+    start = np.maximum(end - backcandles, 0)
+    zeros = np.zeros(fast.shape[:-1] + (1,), dtype=np.int64)
+    above = np.concatenate((zeros, np.cumsum(fast > slow, axis=-1)), axis=-1)
+    below = np.concatenate((zeros, np.cumsum(fast < slow, axis=-1)), axis=-1)
+    up = above[..., end] - above[..., start] == end - start
+    down = below[..., end] - below[..., start] == end - start
+    return np.where(up, 1, np.where(down, -1, 0))
+
+
+def band_signals(trend, close, lower, upper):
+    # 1 on a touch of the lower band in an up trend, -1 on a touch of the upper band in a down trend
+    long = (trend == 1) & (close <= lower)
+    short = (trend == -1) & (close >= upper)
+    return np.where(long, 1, np.where(short, -1, 0))
 
 
 class BBStrategy:
-    def __init__(self, df, ema_fast=30, ema_slow=50, bb_ma='SMA', bb_window=15, bb_std=1.5):
+    def __init__(self, df, ema_fast=30, ema_slow=50, bb_ma='SMA', bb_window=15, bb_std=1.5, compact=False):
         self.df = df
         self.backcandles = 7
         self.ema_fast = ema_fast
@@ -22,52 +40,71 @@ class BBStrategy:
         self.bb_ma = bb_ma          # Bollinger Bands Moving Average which can be SMA or EMA
         self.bb_window = bb_window  # Window for calculating the Bollinger Bands
         self.bb_std = bb_std        # Standart Divietion for calculating the Bollinger Bands
+        self.compact = compact      # Keep only the columns the signals need, as float32
+        self._trend = None          # Trend and signal of every bar, computed once on first use
+        self._signals = None
 
         self._calculate_ema()
         self._calculate_bb()
 
+    def _column(self, values):
+        return values.astype(np.float32) if self.compact else values
+
+    def _indicator(self, name, **params):
+        return pd.Series(REGISTRY.get(name, self.df['Close'], **params), index=self.df.index)
+
     def _calculate_ema(self):
-        self.df['ema_fast'] = self.df['Close'].ewm(span=self.ema_fast, adjust=False).mean()
-        self.df['ema_slow'] = self.df['Close'].ewm(span=self.ema_slow, adjust=False).mean()
+        self.df['ema_fast'] = self._column(self._indicator('ema', span=self.ema_fast))
+        self.df['ema_slow'] = self._column(self._indicator('ema', span=self.ema_slow))
 
     def _calculate_bb(self):
         if self.bb_ma == 'SMA':
-            self.df['bb_sma'] = self.df['Close'].rolling(window=self.bb_window).mean()
-            self.df['bb_std'] = self.df['Close'].rolling(window=self.bb_window).std()
-            self.df['b_upper'] = self.df['bb_sma'] + (self.df['bb_std'] * self.bb_std)
-            self.df['b_lower'] = self.df['bb_sma'] - (self.df['bb_std'] * self.bb_std)
+            bb_ma = self._indicator('sma', window=self.bb_window)
+            bb_std = self._indicator('rolling_std', window=self.bb_window)
+            if not self.compact:
+                self.df['bb_sma'] = bb_ma
+                self.df['bb_std'] = bb_std
         elif self.bb_ma == 'EMA':
-            self.df['bb_ema'] = self.df['Close'].ewm(span=self.bb_window, adjust=False).mean()
-            self.df['bb_std'] = self.df['Close'].ewm(span=self.bb_window, adjust=False).std()
-            self.df['b_upper'] = self.df['bb_ema'] + (self.df['bb_std'] * self.bb_std)
-            self.df['b_lower'] = self.df['bb_ema'] - (self.df['bb_std'] * self.bb_std)
+            bb_ma = self._indicator('ema', span=self.bb_window)
+            bb_std = self._indicator('ewm_std', span=self.bb_window)
+            if not self.compact:
+                self.df['bb_ema'] = bb_ma
+                self.df['bb_std'] = bb_std
+        else:
+            return
+        self.df['b_upper'] = self._column(bb_ma + (bb_std * self.bb_std))
+        self.df['b_lower'] = self._column(bb_ma - (bb_std * self.bb_std))
+
+    def trend(self):
+        if self._trend is None:
+            self._trend = trend(self.df['ema_fast'].to_numpy(), self.df['ema_slow'].to_numpy(), self.backcandles)
+            self._trend.flags.writeable = False
+        return self._trend
+
+    def signals(self):
+        if self._signals is None:
+            self._signals = band_signals(self.trend(), self.df['Close'].to_numpy(), self.df['b_lower'].to_numpy(), self.df['b_upper'].to_numpy())
+            self._signals.flags.writeable = False
+        return self._signals
 
     def check_trend(self, index):
         # This method check if the market is in up trend or down trand
         # For up trand return 1 and for down trand return -1
-        df_slice = self.df.reset_index().copy()
-        start = max(0, index - self.backcandles)
-        end = index
-        relevant_rows = df_slice.iloc[start:end]
-        
-        if all(relevant_rows['ema_fast'] > relevant_rows['ema_slow']):
-            return 1
-        elif all(relevant_rows['ema_fast'] < relevant_rows['ema_slow']):
-            return -1
-        else:
-            return 0
+        return int(self.trend()[index])
 
     def generate_signals(self, index):
-        if (self.check_trend(index) == 1 and self.df['Close'][index] <= self.df['b_lower'][index]):
-            return 1
-        if (self.check_trend(index) == -1 and self.df['Close'][index] >= self.df['b_upper'][index]):
-            return -1
-        return 0
-
+        return int(self.signals()[index])
 
     def run(self, df):
-        self.df['signal'] = self.df.progress_apply(lambda row: self.generate_signals(row.name), axis=1)
-        self.df['pointpos'] = self.df.apply(lambda row: self.pointpos(row), axis=1)
+        signal = self.signals()
+        low = self.df['Low'].to_numpy(dtype=np.float64)
+        high = self.df['High'].to_numpy(dtype=np.float64)
+        pointpos = np.where(signal == 1, low - 1e-4, np.where(signal == -1, high + 1e-4, np.nan))
+        if self.compact:
+            signal = signal.astype(np.int8)
+            pointpos = pointpos.astype(np.float32)
+        self.df['signal'] = signal
+        self.df['pointpos'] = pointpos
         return self.df
 
     def pointpos(self, row):
@@ -0,0 +1,89 @@
+import argparse
+import time
+
+from binance import Binance
+from bb_strategy import BBStrategy
+from macd_strategy import MACDStrategy
+from backtest_gpt4 import run_grid
+from engine import Engine, PercentExit, ATRExit, TrailingExit, TimeStop
+from transport import RecordingTransport, ReplayTransport, serve_replay
+
+# Offline benchmark of the fetch -> strategy -> backtest pipeline.
+#   python benchmark.py record --path recordings/2024 --symbols BTCUSDT ETHUSDT --months 2024-01 2024-02
+# downloads once from the live exchange and keeps every response, then
+#   python benchmark.py replay --path recordings/2024 --symbols BTCUSDT ETHUSDT --months 2024-01 2024-02 --latency 0.05
+# runs the same pipeline on exactly the same data, with simulated latency and rate limits if asked to.
+
+STRATEGIES = {
+    'bb': lambda df: BBStrategy(df).run(df),
+    'macd': lambda df: MACDStrategy(df).run(),
+}
+
+# Exit model variants of the engine timed on the same signals: (exits, fill)
+EXITS = {
+    'percent': lambda: (PercentExit(2.3, 1.8), 'close'),
+    'atr': lambda: (ATRExit(2.0, 1.5), 'level'),
+    'trailing': lambda: (TrailingExit(1.0), 'level'),
+    'time_stop': lambda: ([PercentExit(2.3, 1.8), TimeStop(48)], 'close'),
+}
+
+
+def run_pipeline(loader, jobs, strategy, params, budget=100, trade_percentage=0.2, leverage=20):
+    timings = {}
+    start = time.perf_counter()
+    frames = dict(loader.fetch_many(jobs))
+    timings['fetch'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frames = {job: STRATEGIES[strategy](df) for job, df in frames.items()}
+    timings['strategy'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for df in frames.values():
+        run_grid(df, budget, trade_percentage, leverage, params)
+    timings['backtest'] = time.perf_counter() - start
+
+    timings['total'] = sum(timings.values())
+    timings['bars'] = sum(len(df) for df in frames.values())
+
+    for name, variant in EXITS.items():
+        start = time.perf_counter()
+        for df in frames.values():
+            exits, fill = variant()
+            Engine(df, budget, trade_percentage, leverage, exits, fill).run()
+        timings[f'engine_{name}'] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('--path', default='recordings')
+    parser.add_argument('--symbols', nargs='+', default=['BTCUSDT'])
+    parser.add_argument('--months', nargs='+', default=['2024-04'])
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--strategy', choices=list(STRATEGIES), default='macd')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--rate-limit-every', type=int, default=0)
+    parser.add_argument('--http', action='store_true', help='replay through a local stand-in server instead of in process')
+    args = parser.parse_args()
+
+    if args.mode == 'record':
+        loader = Binance(transport=RecordingTransport(args.path))
+    else:
+        transport = ReplayTransport(args.path, latency=args.latency, rate_limit_every=args.rate_limit_every)
+        if args.http:
+            server, base_url = serve_replay(transport)
+            loader = Binance(base_url=base_url)
+        else:
+            loader = Binance(transport=transport)
+
+    jobs = [(symbol, args.interval, month) for symbol in args.symbols for month in args.months]
+    params = [{'take': 2.3 + 0.1 * i, 'stop': 1.8 + 0.1 * i} for i in range(8)]
+    timings = run_pipeline(loader, jobs, args.strategy, params)
+    print(f"{args.mode}: {timings['bars']} bars | fetch {timings['fetch']:.3f}s | strategy {timings['strategy']:.3f}s | backtest {timings['backtest']:.3f}s | total {timings['total']:.3f}s")
+    print('engine: ' + ' | '.join(f"{name} {timings[f'engine_{name}']:.3f}s" for name in EXITS))
+
+
+if __name__ == '__main__':
+    main()
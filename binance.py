@@ -1,10 +1,10 @@
-import pandas as pd
-import requests
-import datetime
+from downloader import request_json
+from kline_loader import KlineLoader
+from klines import decode_klines, to_frame
 
-class Binance:
-    def __init__(self):
-        self.base_url = 'https://fapi.binance.com'
+class Binance(KlineLoader):
+    def __init__(self, cache=None, index=None, base_url='https://fapi.binance.com', max_connections=10, page_workers=4, compact=False, transport=None):
+        super().__init__('binance', 1500, base_url, cache, index, max_connections, page_workers, compact, transport)
 
     def get_klines(self, symbol, interval, limit=500):
         url = f'{self.base_url}/fapi/v1/klines'
@@ -13,54 +13,39 @@ class Binance:
             'interval': interval,
             'limit': limit
         }
-        df = pd.DataFrame(requests.get(url=url, params=params).json())
-        df = df.iloc[:,0:6]
-        df.columns = ['Open Time', 'Open', 'High', 'Low', 'Close', 'Volume']
-        df['Open Time'] = [datetime.datetime.fromtimestamp(x / 1000) for x in df['Open Time']]
-        df['Open'] = df['Open'].astype(float)
-        df['High'] = df['High'].astype(float)
-        df['Low'] = df['Low'].astype(float)
-        df['Close'] = df['Close'].astype(float)
-        df['Volume'] = df['Volume'].astype(float)
-        return df
+        return to_frame(decode_klines(request_json(self.transport, url, params)), self.compact)
 
-    def fetch_data_month(self, symbol, month, interval):
+    def symbols_info(self):
+        info = {}
+        for symbol in request_json(self.transport, f'{self.base_url}/fapi/v1/exchangeInfo')['symbols']:
+            price_filter = next(f for f in symbol['filters'] if f['filterType'] == 'PRICE_FILTER')
+            info[symbol['symbol']] = {'onboard': symbol['onboardDate'], 'tick_size': float(price_filter['tickSize'])}
+        return info
+
+    def first_bar_time(self, symbol, interval):
         url = f'{self.base_url}/fapi/v1/klines'
-        start_date = datetime.datetime.strptime(f'{month}-01', '%Y-%m-%d')
-        end_date = (start_date + datetime.timedelta(days=31)).replace(day=1) - datetime.timedelta(seconds=1)
-        limit = 1500
-        all_data = []
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'startTime': 0,
+            'limit': 1
+        }
+        data = request_json(self.transport, url, params)
+        if len(data) == 0:
+            return None
+        return int(data[0][0])
+
+    def _get_page(self, symbol, interval, start, end):
+        url = f'{self.base_url}/fapi/v1/klines'
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'startTime': start,
+            'endTime': end,
+            'limit': self.limit
+        }
+        return request_json(self.transport, url, params)
 
-        while start_date < end_date:
-            start_timestamp = int(start_date.timestamp() * 1000)
-            end_timestamp = int((start_date + datetime.timedelta(minutes=30*limit)).timestamp() * 1000)
-            params = {
-                'symbol': symbol,
-                'interval': interval,
-                'startTime': start_timestamp,
-                'endTime': end_timestamp,
-                'limit': limit
-            }
-            response = requests.get(url, params=params)
-            data = response.json()
-            all_data.extend(data)
-            if len(data) < limit:
-                break
-            last_entry = data[-1][0]
-            start_date = datetime.datetime.fromtimestamp(last_entry / 1000)
-        
-        df = pd.DataFrame(all_data)
-        df = df.iloc[:,0:6]
-        df.columns = ['Open Time', 'Open', 'High', 'Low', 'Close', 'Volume']
-        df['Open Time'] = [datetime.datetime.fromtimestamp(x / 1000) for x in df['Open Time']]
-        df['Open'] = df['Open'].astype(float)
-        df['High'] = df['High'].astype(float)
-        df['Low'] = df['Low'].astype(float)
-        df['Close'] = df['Close'].astype(float)
-        df['Volume'] = df['Volume'].astype(float)
-        return df
-    
-        
 
 
 if __name__ == '__main__':
@@ -1,12 +1,16 @@
-import pandas as pd 
-import requests
-import json
-from datetime import datetime as dt 
+from intervals import bybit_interval, canonical_interval, interval_ms
+from downloader import request_json
+from kline_loader import KlineLoader
+from klines import decode_klines, to_frame
+from pagination import plan_pages
 
 
-class Bybit:
-    def __init__(self):
-        self.base_url = 'https://api.bybit.com'
+class Bybit(KlineLoader):
+    # Bybit serves the newest bars of a [start, end] window first
+    newest_first = True
+
+    def __init__(self, cache=None, index=None, base_url='https://api.bybit.com', max_connections=10, page_workers=4, compact=False, transport=None):
+        super().__init__('bybit', 1000, base_url, cache, index, max_connections, page_workers, compact, transport)
 
     def get_klines(self, symbol, interval, category='linear', start=None, end=None, limit=200):
         url = f'{self.base_url}/v5/market/kline'
@@ -18,15 +22,64 @@ class Bybit:
             'end': end,
             'limit': limit
         }
-        result = json.loads(requests.get(url, params=params).text)['result']
-        df = pd.DataFrame(result['list'])
-        df = df.iloc[:,0:6]
-        df = df.iloc[::-1].reset_index(drop=True)
-        df.columns = ['Open Time', 'Open', 'High', 'Low', 'Close', 'Volume']
-        df['Open Time'] = [dt.fromtimestamp(int(x) / 1000) for x in df['Open Time']]
-        df['Open'] = df['Open'].astype(float)
-        df['High'] = df['High'].astype(float)
-        df['Low'] = df['Low'].astype(float)
-        df['Close'] = df['Close'].astype(float)
-        df['Volume'] = df['Volume'].astype(float)
-        return df
+        result = self._result(url, params)
+        return to_frame(decode_klines(result['list'], newest_first=True), self.compact)
+
+    def cache_key(self, category='linear'):
+        return f'bybit-{category}'
+
+    def canonical_interval(self, interval):
+        return canonical_interval(interval)
+
+    def indexed(self, category='linear'):
+        # The symbol index holds the linear (USDT perpetual) listings
+        return category == 'linear'
+
+    def symbols_info(self, category='linear'):
+        info = {}
+        for instrument in self._instruments(category):
+            info[instrument['symbol']] = {'onboard': int(instrument['launchTime']), 'tick_size': float(instrument['priceFilter']['tickSize'])}
+        return info
+
+    def first_bar_time(self, symbol, interval, category='linear'):
+        interval = canonical_interval(interval)
+        instruments = self._instruments(category, symbol)
+        if len(instruments) == 0:
+            return None
+        # The first bar opens at or right before the launch time
+        launch_time = int(instruments[0]['launchTime'])
+        page_start, page_end = plan_pages(interval, launch_time - interval_ms(interval), launch_time + self.limit * interval_ms(interval), self.limit)[0]
+        data = self._get_page(symbol, interval, page_start, page_end, category)
+        return min(int(row[0]) for row in data) if len(data) > 0 else launch_time
+
+    def _instruments(self, category, symbol=None):
+        url = f'{self.base_url}/v5/market/instruments-info'
+        params = {'category': category, 'limit': 1000}
+        if symbol is not None:
+            params['symbol'] = symbol
+        instruments = []
+        while True:
+            result = self._result(url, params)
+            instruments.extend(result.get('list', []))
+            if not result.get('nextPageCursor'):
+                return instruments
+            params['cursor'] = result['nextPageCursor']
+
+    def _get_page(self, symbol, interval, start, end, category='linear'):
+        url = f'{self.base_url}/v5/market/kline'
+        params = {
+            'symbol': symbol,
+            'interval': bybit_interval(interval),
+            'category': category,
+            'start': start,
+            'end': end,
+            'limit': self.limit
+        }
+        return self._result(url, params)['list']
+
+    def _result(self, url, params):
+        # Bybit answers errors with HTTP 200 and a non zero retCode
+        data = request_json(self.transport, url, params)
+        if data.get('retCode', 0) != 0:
+            raise ValueError(f"Bybit error {data['retCode']} for {url} {params}: {data.get('retMsg')}")
+        return data['result']
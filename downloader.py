@@ -0,0 +1,38 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def make_session(max_connections=10):
+    # One keep-alive pool shared by every thread of a client
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_many(fetch, jobs, max_workers=8):
+    # Runs fetch(*job) for every job on a thread pool and yields (job, result) as soon as each one finishes.
+    # Jobs that were not started yet are cancelled when the caller stops iterating.
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(fetch, *job): job for job in jobs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def request_json(transport, url, params=None, retries=5):
+    # GET through a transport, waiting out 418/429 rate limit answers for the time the exchange asks for.
+    # Any other error answer, or a rate limit still there after the retries, raises requests.HTTPError.
+    for attempt in range(retries + 1):
+        response = transport.get(url, params=params)
+        if response.status_code not in (418, 429) or attempt == retries:
+            break
+        time.sleep(float(response.headers.get('Retry-After', 2 ** attempt)))
+    if not 200 <= response.status_code < 300:
+        raise requests.HTTPError(f'{response.status_code} for {url} {params}: {response.text}', response=response)
+    return response.json()
@@ -0,0 +1,295 @@
+import bisect
+import numpy as np
+import pandas as pd
+
+from klines import time_span
+from ledger import KEYS, TradeLedger
+from indicators import average_true_range
+from touch_index import TouchIndex
+
+# One backtest loop for every exit rule. Entries are the bars with signal 1 (long) or -1 (short), one
+# position at a time; after an exit the next entry is the first signal after the exit bar.
+# Exit models say where a position opened at entry_index is closed:
+#   PercentExit(take_profit, stop_loss)      - levels at a percentage of the entry price
+#   ATRExit(tp_multiplier, sl_multiplier)    - levels at a multiple of the ATR of the entry bar
+#   TrailingExit(trail)                      - stop trailing the best price since entry by a percentage
+#   TimeStop(bars)                           - closes the position bars after entry
+# With several models the earliest exit wins, the first model in the list on the same bar.
+# The fill policy sets the exit price: 'close' of the exit bar, or 'level' - the price of the level touched,
+# take profit first when a bar touches both unless an IntrabarResolver settles the order from finer bars.
+# simulate() is the engine, simulate_bars() the reference loop walking every bar that it must agree with, and
+# simulate_grid() runs a LevelExit whose params are arrays, one independent backtest per row, for run_grid.
+
+FILLS = ('close', 'level')
+
+
+def _side(is_long, long_value, short_value):
+    # The value for the side of a trade, element wise for arrays of trades
+    if isinstance(is_long, np.ndarray):
+        return np.where(is_long, long_value, short_value)
+    return long_value if is_long else short_value
+
+
+class LevelExit:
+    # Base of the exits with a take profit and a stop loss fixed at entry.
+    # levels() takes one trade, or arrays of trades (and of params, a row each) for simulate_grid.
+    def levels(self, engine, entry_index, entry_price, is_long):
+        raise NotImplementedError
+
+    def bounds(self, take_profit, stop_loss, is_long):
+        # Long exits above at take profit or below at stop loss, short the other way round
+        return _side(is_long, take_profit, stop_loss), _side(is_long, stop_loss, take_profit)
+
+    def first_exit(self, engine, entry_index, entry_price, is_long, limit):
+        take_profit, stop_loss = self.levels(engine, entry_index, entry_price, is_long)
+        upper, lower = self.bounds(take_profit, stop_loss, is_long)
+        exit_index = engine.first_touch(entry_index + 1, upper, lower)
+        if exit_index < 0:
+            return None
+        touched_upper = engine.highs[exit_index] >= upper
+        touched_lower = engine.lows[exit_index] <= lower
+        if touched_upper and touched_lower:
+            # Both levels inside one bar: take profit first, unless the resolver can tell from the fine bars.
+            # With fill='close' the exit price is the close either way, so the resolver is not asked.
+            side = None
+            if engine.resolver is not None and engine.fill == 'level':
+                side = engine.resolver.first_side(engine.df['Open Time'].iloc[exit_index], upper, lower)
+            if side is None:
+                return exit_index, take_profit, take_profit, stop_loss
+            touched_upper = side == 'upper'
+        return exit_index, upper if touched_upper else lower, take_profit, stop_loss
+
+    def first_exits(self, engine, entry_index, take_profit, stop_loss, is_long):
+        # first_exit for arrays of trades without a resolver: exit indexes (-1 if never closed) and levels touched
+        upper, lower = self.bounds(take_profit, stop_loss, is_long)
+        exit_index = engine.index.first_touch_many(entry_index + 1, upper, lower)
+        bar = np.maximum(exit_index, 0)
+        touched_upper = engine.high[bar] >= upper
+        touched_lower = engine.low[bar] <= lower
+        # Both levels inside one bar: take profit first
+        return exit_index, np.where(touched_upper & touched_lower, take_profit, np.where(touched_upper, upper, lower))
+
+
+class PercentExit(LevelExit):
+    def __init__(self, take_profit, stop_loss):
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+
+    def levels(self, engine, entry_index, entry_price, is_long):
+        take_profit = _side(is_long, entry_price * (1 + self.take_profit / 100), entry_price * (1 - self.take_profit / 100))
+        stop_loss = _side(is_long, entry_price * (1 - self.stop_loss / 100), entry_price * (1 + self.stop_loss / 100))
+        return take_profit, stop_loss
+
+
+class ATRExit(LevelExit):
+    # values: a precomputed ATR array, otherwise the ATR of the frame is computed with period
+    def __init__(self, tp_multiplier, sl_multiplier, period=14, values=None):
+        self.tp_multiplier = tp_multiplier
+        self.sl_multiplier = sl_multiplier
+        self.period = period
+        self.values = values
+
+    def levels(self, engine, entry_index, entry_price, is_long):
+        values = self.values if self.values is not None else average_true_range(engine.df, self.period)
+        if isinstance(entry_index, np.ndarray):
+            atr = np.asarray(values, dtype=np.float64)[entry_index]
+        else:
+            atr = engine.as_list(values)[entry_index]
+        take_profit = atr * self.tp_multiplier
+        stop_loss = atr * self.sl_multiplier
+        return _side(is_long, entry_price + take_profit, entry_price - take_profit), _side(is_long, entry_price - stop_loss, entry_price + stop_loss)
+
+
+class TrailingExit:
+    # The stop of a bar is trail percent below the highest High since entry (above the lowest Low for a short),
+    # starting from the entry price and moved after each bar is checked
+    def __init__(self, trail, chunk=64):
+        self.trail = trail
+        self.chunk = chunk
+
+    def first_exit(self, engine, entry_index, entry_price, is_long, limit):
+        best = entry_price
+        lo, chunk = entry_index + 1, self.chunk
+        while lo <= limit:
+            hi = min(lo + chunk, limit + 1)
+            if is_long:
+                stops = np.fmax.accumulate(np.concatenate(([best], engine.high[lo:hi - 1]))) * (1 - self.trail / 100)
+                hits = np.flatnonzero(engine.low[lo:hi] <= stops)
+                best = np.fmax(best, np.fmax.reduce(engine.high[lo:hi]))
+            else:
+                stops = np.fmin.accumulate(np.concatenate(([best], engine.low[lo:hi - 1]))) * (1 + self.trail / 100)
+                hits = np.flatnonzero(engine.high[lo:hi] >= stops)
+                best = np.fmin(best, np.fmin.reduce(engine.low[lo:hi]))
+            if len(hits) > 0:
+                stop_loss = float(stops[hits[0]])
+                return lo + int(hits[0]), stop_loss, np.nan, stop_loss
+            lo, chunk = hi, chunk * 2
+        return None
+
+
+class TimeStop:
+    def __init__(self, bars):
+        self.bars = bars
+
+    def first_exit(self, engine, entry_index, entry_price, is_long, limit):
+        exit_index = entry_index + self.bars
+        if exit_index > limit:
+            return None
+        return exit_index, engine.closes[exit_index], np.nan, np.nan
+
+
+class Engine:
+    def __init__(self, df: pd.DataFrame, initial_budget: float, trade_percentage: float, leverage: int, exits, fill: str = 'close', trade_keys=KEYS, resolver=None, signal=None, index=None):
+        if fill not in FILLS:
+            raise ValueError(f'Unsupported fill policy: {fill}')
+        self.df = df
+        self.initial_budget = initial_budget
+        self.trade_percentage = trade_percentage
+        self.leverage = leverage
+        self.exits = exits if isinstance(exits, (list, tuple)) else [exits]
+        self.fill = fill
+        self.resolver = resolver  # IntrabarResolver for the bars touching both levels, matters with fill='level'
+        self.signal = df['signal'].to_numpy() if signal is None else np.asarray(signal)  # signal replaces df['signal']
+        self.high = df['High'].to_numpy(dtype=np.float64)
+        self.low = df['Low'].to_numpy(dtype=np.float64)
+        self.close = df['Close'].to_numpy(dtype=np.float64)
+        # The per bar checks run on plain lists, numpy scalars are much slower to index and compare
+        self.highs, self.lows, self.closes = self.high.tolist(), self.low.tolist(), self.close.tolist()
+        self.n = len(self.closes)
+        self.trades = TradeLedger(df['Open Time'], trade_keys)
+        self.final_budget = initial_budget
+        self._index = index  # a TouchIndex of the same bars, built on first use if not given
+        self._lists = {}
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = TouchIndex(self.high, self.low)
+        return self._index
+
+    def as_list(self, values):
+        # values as a list of floats, converted once per engine
+        if id(values) not in self._lists:
+            self._lists[id(values)] = (values, np.asarray(values, dtype=np.float64).tolist())
+        return self._lists[id(values)][1]
+
+    def first_touch(self, start, upper, lower):
+        # First bar >= start with High >= upper or Low <= lower, -1 if none.
+        # Most trades end within a few bars, those are checked on the lists before asking the touch index.
+        for bar in range(start, min(start + 16, self.n)):
+            if self.highs[bar] >= upper or self.lows[bar] <= lower:
+                return bar
+        return self.index.first_touch(start + 16, upper, lower)
+
+    def profit(self, entry_price, exit_price, is_long, budget):
+        move = _side(is_long, exit_price - entry_price, entry_price - exit_price)
+        return move * self.leverage * self.trade_percentage * budget / entry_price
+
+    def run(self):
+        self.simulate()
+        return self.statistics()
+
+    def simulate(self):
+        # Fills self.trades and self.final_budget
+        signals = self.signal.tolist()
+        entries = np.flatnonzero((self.signal == 1) | (self.signal == -1)).tolist()
+        budget = self.initial_budget
+        k = 0
+
+        while k < len(entries):
+            entry_index = entries[k]
+            entry_price = self.closes[entry_index]
+            is_long = signals[entry_index] == 1
+            best, limit = None, self.n - 1
+            for model in self.exits:
+                hit = model.first_exit(self, entry_index, entry_price, is_long, limit)
+                if hit is not None and (best is None or hit[0] < best[0]):
+                    best, limit = hit, hit[0]
+            if best is None:
+                break
+
+            exit_index, level, take_profit, stop_loss = best
+            exit_price = self.closes[exit_index] if self.fill == 'close' else level
+            profit = self.profit(entry_price, exit_price, is_long, budget)
+            self.trades.append(entry_index, exit_index, is_long, budget, budget + profit, profit, entry_price, exit_price, take_profit, stop_loss)
+            budget += profit
+            k = bisect.bisect_right(entries, exit_index, k)
+
+        self.final_budget = budget
+
+    def simulate_bars(self):
+        # Reference for simulate() with a single LevelExit and no resolver: checks every bar in turn
+        if len(self.exits) != 1 or not isinstance(self.exits[0], LevelExit):
+            raise ValueError(f'Unsupported exits for the bar loop: {self.exits}')
+        model = self.exits[0]
+        signals = self.signal.tolist()
+        budget = self.initial_budget
+        position = None
+
+        for bar in range(self.n):
+            if position is None:
+                if signals[bar] == 1 or signals[bar] == -1:
+                    is_long = signals[bar] == 1
+                    take_profit, stop_loss = model.levels(self, bar, self.closes[bar], is_long)
+                    position = (bar, self.closes[bar], is_long, take_profit, stop_loss)
+                continue
+            entry_index, entry_price, is_long, take_profit, stop_loss = position
+            upper, lower = model.bounds(take_profit, stop_loss, is_long)
+            touched_upper, touched_lower = self.highs[bar] >= upper, self.lows[bar] <= lower
+            if touched_upper or touched_lower:
+                if self.fill == 'close':
+                    exit_price = self.closes[bar]
+                else:
+                    exit_price = take_profit if touched_upper and touched_lower else (upper if touched_upper else lower)
+                profit = self.profit(entry_price, exit_price, is_long, budget)
+                self.trades.append(entry_index, bar, is_long, budget, budget + profit, profit, entry_price, exit_price, take_profit, stop_loss)
+                budget += profit
+                position = None
+
+        self.final_budget = budget
+
+    def simulate_grid(self, rows):
+        # simulate() for each of the rows of a single LevelExit with array params, every row its own backtest:
+        # each round moves all the rows still trading to their next entry and exit together, without a ledger
+        # or a resolver. Returns the final budget, the peak budget and the number of trades of every row.
+        if len(self.exits) != 1 or not isinstance(self.exits[0], LevelExit):
+            raise ValueError(f'Unsupported exits for a grid: {self.exits}')
+        model = self.exits[0]
+        entries = np.flatnonzero((self.signal == 1) | (self.signal == -1))
+        budget = np.full(rows, float(self.initial_budget))
+        peak_budget = budget.copy()
+        amount_trades = np.zeros(rows, dtype=np.int64)
+        k = np.zeros(rows, dtype=np.int64)
+        active = np.arange(rows) if len(entries) > 0 else np.empty(0, dtype=np.int64)
+
+        while len(active) > 0:
+            entry_index = entries[np.minimum(k, len(entries) - 1)]
+            entry_price = self.close[entry_index]
+            is_long = self.signal[entry_index] == 1
+            take_profit, stop_loss = np.broadcast_arrays(*model.levels(self, entry_index, entry_price, is_long))
+            entry_index, entry_price, is_long = entry_index[active], entry_price[active], is_long[active]
+            exit_index, level = model.first_exits(self, entry_index, take_profit[active], stop_loss[active], is_long)
+
+            closed = exit_index >= 0
+            active, entry_price, is_long, exit_index, level = active[closed], entry_price[closed], is_long[closed], exit_index[closed], level[closed]
+            exit_price = self.close[exit_index] if self.fill == 'close' else level
+            budget[active] += self.profit(entry_price, exit_price, is_long, budget[active])
+            peak_budget[active] = np.maximum(peak_budget[active], budget[active])
+            amount_trades[active] += 1
+
+            k[active] = np.searchsorted(entries, exit_index, side='right')
+            active = active[k[active] < len(entries)]
+
+        return budget, peak_budget, amount_trades
+
+    def statistics(self):
+        return {
+            'period': time_span(self.df['Open Time']),
+            'start_budget': self.initial_budget,
+            'end_budget': self.final_budget,
+            'peak_budget': self.trades.peak_budget(self.initial_budget),
+            'final_result_percentage': ((self.final_budget - self.initial_budget) / self.initial_budget) * 100,
+            'amount_trades': len(self.trades),
+            'total_signals': int(np.count_nonzero(self.signal != 0)),
+            'trades': self.trades
+        }
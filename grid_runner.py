@@ -0,0 +1,107 @@
+import os
+import itertools
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from tqdm import tqdm
+
+from ohlcv_store import OHLCVStore
+from pagination import month_closed
+from bb_strategy import BBStrategy
+from macd_strategy import MACDStrategy
+from backtest_gpt4 import run_grid
+
+# Sweeps coins x months x timeframes x strategies x take/stop params over a process pool.
+#   spec = {'coins': ['BTCUSDT'], 'months': ['2024-01', '2024-02'], 'timeframes': ['1h'],
+#           'strategies': ['bb'], 'params': [{'take': 2.3, 'stop': 1.8}]}
+# prepare() downloads every (coin, timeframe, month) once into an OHLCVStore, then every job is a
+# (coin, timeframe, month, strategy) key: the worker memory maps the bars from the store itself, so no
+# DataFrame is pickled, runs the strategy and evaluates the whole params grid with run_grid.
+# run() yields (job, result) as jobs finish, one result row per param, with at most max_pending jobs in flight.
+
+# Strategy name -> function(df, compact, **indicator params) returning the frame with its signal column
+STRATEGIES = {
+    'bb': lambda df, compact, **params: BBStrategy(df, compact=compact, **params).run(df),
+    'macd': lambda df, compact, **params: MACDStrategy(df, compact=compact, **params).run(),
+}
+
+
+def expand(spec):
+    # Every job of a spec, in spec order
+    return list(itertools.product(spec['coins'], spec['timeframes'], spec['months'], spec.get('strategies', ['bb'])))
+
+
+def _run_job(store_path, exchange, compact, job, params, budget, trade_percentage, leverage):
+    coin, timeframe, month, strategy = job
+    df = OHLCVStore(store_path, exchange, compact).fetch_data_month(coin, month, timeframe)
+    if len(df) == 0:
+        # Not listed yet: nothing traded, the budget stays as it is
+        df = pd.DataFrame({'Open Time': [], 'signal': [], 'High': [], 'Low': [], 'Close': []})
+    else:
+        df = STRATEGIES[strategy](df, compact)
+    result = run_grid(df, budget, trade_percentage, leverage, params)
+    result.insert(0, 'strategy', strategy)
+    result.insert(0, 'month', month)
+    result.insert(0, 'timeframe', timeframe)
+    result.insert(0, 'coin', coin)
+    return job, result
+
+
+class GridRunner:
+    def __init__(self, loader, store=None, index=None, budget=100, trade_percentage=0.2, leverage=20, max_workers=None, max_pending=None, progress=True):
+        self.loader = loader
+        self.store = store or OHLCVStore(exchange=loader.name, compact=getattr(loader, 'compact', False))
+        self.index = index
+        self.budget = budget
+        self.trade_percentage = trade_percentage
+        self.leverage = leverage
+        self.max_workers = max_workers or os.cpu_count()
+        self.max_pending = max_pending or 2 * self.max_workers  # bounds the results waiting in memory
+        self.progress = progress
+
+    def complete(self, coin, timeframe, month):
+        # A month is done once it was downloaded after it closed, whatever bars it has: a delisted or halted
+        # symbol is not asked again. The month still open, one fetched while it was open and one an interrupted
+        # fill did not reach are downloaded again (the store merges the bars it already has).
+        fetched = self.store.fetched(coin, timeframe).get(month)
+        return fetched is not None and month_closed(month, timeframe, fetched)
+
+    def prepare(self, spec):
+        # Downloads the (coin, timeframe, month) bars that are missing or incomplete in the store
+        for coin, timeframe in itertools.product(spec['coins'], spec['timeframes']):
+            months = [month for month in spec['months'] if not self.complete(coin, timeframe, month)]
+            if self.index is not None:
+                months = [month for month in months if self.index.listed(self.loader, coin, timeframe, month)]
+            if months:
+                self.store.fill(self.loader, coin, timeframe, months)
+
+    def run(self, spec):
+        # Yields (job, run_grid rows) for every job as soon as it finishes.
+        # Jobs that were not started yet are cancelled when the caller stops iterating.
+        self.prepare(spec)
+        jobs = expand(spec)
+        progress = tqdm(total=len(jobs), disable=not self.progress)
+        jobs = iter(jobs)
+        args = (self.store.path, self.store.exchange, self.store.compact)
+        kwargs = {'params': spec['params'], 'budget': self.budget, 'trade_percentage': self.trade_percentage, 'leverage': self.leverage}
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        try:
+            pending = set()
+            for job in itertools.islice(jobs, self.max_pending):
+                pending.add(executor.submit(_run_job, *args, job, **kwargs))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for job in itertools.islice(jobs, 1):
+                        pending.add(executor.submit(_run_job, *args, job, **kwargs))
+                    progress.update(1)
+                    yield future.result()
+        finally:
+            progress.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run_frame(self, spec):
+        # Every result row of the sweep in one DataFrame, in spec order
+        results = dict(self.run(spec))
+        if not results:
+            return pd.DataFrame()
+        return pd.concat([results[job] for job in expand(spec)], ignore_index=True)
@@ -0,0 +1,104 @@
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Indicators shared by every strategy, backtest and sweep of the process instead of being recomputed per object.
+# A value is keyed by (fingerprints of the input series, indicator name, params): the fingerprint is a blake2b
+# digest of the values, so two frames holding the same bars share their indicators. The values are hashed again
+# on every call, so a series changed in place is looked up under its new values, never a stale digest.
+# Values are computed with pandas exactly as before and kept as read only float64 arrays. The least recently
+# used ones are evicted once the registry holds more than max_bytes.
+#   close = df['Close']
+#   ema = REGISTRY.get('ema', close, span=30)
+#   emas = REGISTRY.family('ema', close, span=[10, 20, 30])  ->  3 x bars array, a row per span
+#   REGISTRY.stats()  ->  {'hits': ..., 'misses': ..., 'evictions': ..., 'entries': ..., 'bytes': ...}
+
+
+def _true_range(high, low, close):
+    return pd.concat([high - low, abs(high - close.shift(1)), abs(low - close.shift(1))], axis=1).max(axis=1)
+
+
+def _macd(close, fast, slow):
+    return pd.Series(REGISTRY.get('ema', close, span=fast)) - pd.Series(REGISTRY.get('ema', close, span=slow))
+
+
+# Indicator name -> function(*input series, **params) returning the values
+INDICATORS = {
+    'ema': lambda close, span: close.ewm(span=span, adjust=False).mean(),
+    'ewm_std': lambda close, span: close.ewm(span=span, adjust=False).std(),
+    'sma': lambda close, window: close.rolling(window=window).mean(),
+    'rolling_std': lambda close, window: close.rolling(window=window).std(),
+    'macd': _macd,
+    'macd_signal': lambda close, fast, slow, smooth: pd.Series(REGISTRY.get('macd', close, fast=fast, slow=slow)).ewm(span=smooth, adjust=False).mean(),
+    'true_range': _true_range,
+    'atr': lambda high, low, close, period: pd.Series(REGISTRY.get('true_range', high, low, close)).rolling(window=period, min_periods=1).mean(),
+}
+
+
+class IndicatorRegistry:
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> read only array, least recently used first
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def fingerprint(self, series):
+        values = np.ascontiguousarray(series.to_numpy() if isinstance(series, pd.Series) else series)
+        digest = hashlib.blake2b(f'{values.dtype.str}{values.shape}'.encode(), digest_size=16)
+        digest.update(values.view(np.uint8).reshape(-1) if values.size else b'')
+        return digest.hexdigest()
+
+    def get(self, name, *series, **params):
+        if name not in INDICATORS:
+            raise ValueError(f'Unsupported indicator: {name}')
+        key = (tuple(self.fingerprint(s) for s in series), name, tuple(sorted(params.items())))
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        inputs = [s if isinstance(s, pd.Series) else pd.Series(s) for s in series]
+        values = np.array(INDICATORS[name](*inputs, **params), dtype=np.float64)
+        values.flags.writeable = False
+        with self._lock:
+            if key not in self.entries and values.nbytes <= self.max_bytes:
+                self.entries[key] = values
+                self.nbytes += values.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+                    self.evictions += 1
+            return self.entries.get(key, values)
+
+    def family(self, name, *series, **params):
+        # One row per combination of the list valued params (itertools.product order), the others fixed
+        swept = {key: value for key, value in params.items() if isinstance(value, (list, tuple, np.ndarray))}
+        fixed = {key: value for key, value in params.items() if key not in swept}
+        rows = [self.get(name, *series, **fixed, **dict(zip(swept, values))) for values in itertools.product(*swept.values())]
+        return np.vstack(rows) if rows else np.empty((0, len(series[0])))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.entries), 'bytes': self.nbytes}
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+REGISTRY = IndicatorRegistry()
+
+
+def true_range(df):
+    return REGISTRY.get('true_range', df['High'], df['Low'], df['Close'])
+
+
+def average_true_range(df, period):
+    return REGISTRY.get('atr', df['High'], df['Low'], df['Close'], period=period)
@@ -0,0 +1,70 @@
+MINUTE_MS = 60 * 1000
+
+# Binance kline intervals and their length in milliseconds ('1M' is left out on purpose,
+# calendar months do not have a fixed length)
+INTERVAL_MS = {
+    '1m': MINUTE_MS,
+    '3m': 3 * MINUTE_MS,
+    '5m': 5 * MINUTE_MS,
+    '15m': 15 * MINUTE_MS,
+    '30m': 30 * MINUTE_MS,
+    '1h': 60 * MINUTE_MS,
+    '2h': 2 * 60 * MINUTE_MS,
+    '4h': 4 * 60 * MINUTE_MS,
+    '6h': 6 * 60 * MINUTE_MS,
+    '8h': 8 * 60 * MINUTE_MS,
+    '12h': 12 * 60 * MINUTE_MS,
+    '1d': 24 * 60 * MINUTE_MS,
+    '3d': 3 * 24 * 60 * MINUTE_MS,
+    '1w': 7 * 24 * 60 * MINUTE_MS,
+}
+
+
+def interval_ms(interval):
+    if interval not in INTERVAL_MS:
+        raise ValueError(f'Unsupported interval: {interval}')
+    return INTERVAL_MS[interval]
+
+
+def interval_offset_ms(interval):
+    # Bars are aligned to the unix epoch except weekly ones, which open on Monday (the epoch was a Thursday)
+    if interval == '1w':
+        return 4 * INTERVAL_MS['1d']
+    return 0
+
+
+# Bybit v5 uses minutes for intraday intervals and letters for the rest
+BYBIT_INTERVALS = {
+    '1m': '1',
+    '3m': '3',
+    '5m': '5',
+    '15m': '15',
+    '30m': '30',
+    '1h': '60',
+    '2h': '120',
+    '4h': '240',
+    '6h': '360',
+    '12h': '720',
+    '1d': 'D',
+    '1w': 'W',
+}
+
+
+def bybit_interval(interval):
+    # Accepts both Binance style intervals ('30m') and native Bybit ones (30, '30', 'D')
+    interval = str(interval)
+    if interval in BYBIT_INTERVALS.values():
+        return interval
+    if interval not in BYBIT_INTERVALS:
+        raise ValueError(f'Unsupported interval: {interval}')
+    return BYBIT_INTERVALS[interval]
+
+
+def canonical_interval(interval):
+    # Binance style name of a Bybit interval, used for planning pages and as the cache key
+    interval = str(interval)
+    for name, bybit_name in BYBIT_INTERVALS.items():
+        if interval == bybit_name:
+            return name
+    interval_ms(interval)
+    return interval
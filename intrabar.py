@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from intervals import interval_ms
+from pagination import to_ms
+
+
+class IntrabarResolver:
+    # Settles which level a bar touched first when its High and Low reach both the upper and the lower one.
+    # Only those bars are looked at: the fine bars (1m by default) inside the coarse bar are read from an
+    # OHLCVStore, memory mapped, and the first fine bar touching a level decides. With a loader, a month
+    # missing from the store is downloaded into it the first time it is needed. Every answer is cached.
+    # first_side() gives 'upper', 'lower', or None when the fine bars cannot tell (no data, or one fine bar
+    # touching both levels), in which case the engine keeps its default of take profit first.
+    def __init__(self, store, symbol, interval, fine_interval='1m', loader=None):
+        self.store = store
+        self.symbol = symbol
+        self.interval_ms = interval_ms(interval)
+        self.fine_interval = fine_interval
+        self.loader = loader
+        self.cache = {}
+        self.loaded = set()
+        self._columns = None
+        self.resolved = 0
+        self.unresolved = 0
+
+    def _fine_bars(self, start, end):
+        if self.loader is not None:
+            month = pd.Timestamp(start, unit='ms').strftime('%Y-%m')
+            if month not in self.loaded:
+                self.loaded.add(month)
+                if len(self.store.fetch_data_month(self.symbol, month, self.fine_interval)) == 0:
+                    self.store.fill(self.loader, self.symbol, self.fine_interval, [month])
+                    self._columns = None
+        if self._columns is None:
+            self._columns = self.store.columns(self.symbol, self.fine_interval)
+        times = self._columns['time']
+        lo = np.searchsorted(times, start, side='left')
+        hi = np.searchsorted(times, end, side='right')
+        return self._columns['high'][lo:hi], self._columns['low'][lo:hi]
+
+    def first_side(self, bar_time, upper, lower):
+        start = to_ms(bar_time)
+        key = (start, upper, lower)
+        if key not in self.cache:
+            high, low = self._fine_bars(start, start + self.interval_ms - 1)
+            touched_upper = high >= upper
+            touched_lower = low <= lower
+            hits = np.flatnonzero(touched_upper | touched_lower)
+            side = None
+            if len(hits) > 0 and touched_upper[hits[0]] != touched_lower[hits[0]]:
+                side = 'upper' if touched_upper[hits[0]] else 'lower'
+            if side is None:
+                self.unresolved += 1
+            else:
+                self.resolved += 1
+            self.cache[key] = side
+        return self.cache[key]
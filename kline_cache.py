@@ -0,0 +1,149 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+
+class KlineCache:
+    # Local columnar cache for closed months of klines.
+    # Every (exchange, symbol, interval, month) partition is one .npz file with a column per field:
+    #   <path>/<exchange>/<symbol>/<interval>/<YYYY-MM>.npz
+    # The file mtime is used as the last access time, the least recently used partitions
+    # are evicted once the cache grows above max_bytes. The byte total is counted from disk once and then kept
+    # up to date by every write, so the tree is only walked again when it goes above max_bytes.
+    # One cache can be shared by the threads of a loader: writes and evictions are serialized, and a partition
+    # removed by another thread (or process) while it is being read, touched or listed counts as already gone.
+    version = 2
+    columns = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+    def __init__(self, path='.kline_cache', max_bytes=2 * 1024 ** 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        self._total = None  # bytes on disk, None until counted
+
+    def _partition(self, exchange, symbol, interval, month):
+        return os.path.join(self.path, exchange, symbol, interval, f'{month}.npz')
+
+    def get(self, exchange, symbol, interval, month):
+        path = self._partition(exchange, symbol, interval, month)
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != self.version:
+                    raise ValueError(f'Stale cache partition: {path}')
+                columns = {column: data[column] for column in self.columns}
+        except (OSError, KeyError, ValueError):
+            with self.lock:
+                if self._remove(path):
+                    self._total = None
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # evicted since it was read, the columns are still good
+        self.hits += 1
+        return columns
+
+    def put(self, exchange, symbol, interval, month, columns):
+        path = self._partition(exchange, symbol, interval, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, version=self.version, **{column: columns[column] for column in self.columns})
+        with self.lock:
+            total = self._running_total() + os.path.getsize(tmp_path) - self._size(path)
+            os.replace(tmp_path, path)
+            self._total = total
+            if total > self.max_bytes:
+                self.evict()
+
+    def _size(self, path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _running_total(self):
+        if self._total is None:
+            self._total = self.size()
+        return self._total
+
+    def _remove(self, path):
+        # False when the file was already removed
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def entries(self):
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith('.npz'):
+                    continue
+                path = os.path.join(root, name)
+                parts = os.path.relpath(root, self.path).split(os.sep)
+                if len(parts) != 3:
+                    continue  # not an <exchange>/<symbol>/<interval>/<month>.npz partition
+                exchange, symbol, interval = parts
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append({
+                    'exchange': exchange,
+                    'symbol': symbol,
+                    'interval': interval,
+                    'month': name[:-len('.npz')],
+                    'bytes': stat.st_size,
+                    'last_access': stat.st_mtime,
+                    'path': path
+                })
+        return entries
+
+    def info(self):
+        df = pd.DataFrame(self.entries(), columns=['exchange', 'symbol', 'interval', 'month', 'bytes', 'last_access', 'path'])
+        df['last_access'] = pd.to_datetime(df['last_access'], unit='s')
+        return df.sort_values(['exchange', 'symbol', 'interval', 'month']).reset_index(drop=True)
+
+    def size(self):
+        return sum(entry['bytes'] for entry in self.entries())
+
+    def invalidate(self, exchange=None, symbol=None, interval=None, month=None):
+        # Remove every partition matching the given fields, None matches anything
+        removed = 0
+        for entry in self.entries():
+            if exchange is not None and entry['exchange'] != exchange:
+                continue
+            if symbol is not None and entry['symbol'] != symbol:
+                continue
+            if interval is not None and entry['interval'] != interval:
+                continue
+            if month is not None and entry['month'] != month:
+                continue
+            removed += self._remove(entry['path'])
+        with self.lock:
+            self._total = None
+        return removed
+
+    def clear(self):
+        return self.invalidate()
+
+    def evict(self):
+        with self.lock:
+            entries = sorted(self.entries(), key=lambda entry: entry['last_access'])
+            total = sum(entry['bytes'] for entry in entries)
+            evicted = 0
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                evicted += self._remove(entry['path'])
+                total -= entry['bytes']
+            self._total = total
+            return evicted
@@ -0,0 +1,76 @@
+import functools
+
+from downloader import fetch_many
+from transport import HttpTransport
+from pagination import month_closed, month_range, plan_pages, stitch, to_ms
+from klines import decode_klines, to_frame
+
+
+class KlineLoader:
+    # Month, range and concurrent downloads shared by the exchange loaders. An exchange sets name and limit (bars
+    # per page) and implements _get_page(symbol, interval, start, end, **params) returning the raw kline rows;
+    # params are its extra request params (Bybit's category), passed through every call down to the page.
+    newest_first = False  # the exchange serves the newest bars of a window first, its pages are requested newest first
+
+    def __init__(self, name, limit, base_url, cache=None, index=None, max_connections=10, page_workers=4, compact=False, transport=None):
+        self.name = name
+        self.base_url = base_url
+        self.cache = cache
+        self.index = index
+        self.compact = compact
+        self.limit = limit
+        self.max_connections = max_connections
+        self.page_workers = page_workers
+        self.transport = transport or HttpTransport(max_connections)
+
+    def cache_key(self, **params):
+        # Exchange name of the cache partitions
+        return self.name
+
+    def canonical_interval(self, interval):
+        return interval
+
+    def indexed(self, **params):
+        # Whether the symbol index (first bars) applies to the requests made with params
+        return True
+
+    def fetch_data_month(self, symbol, month, interval, **params):
+        interval = self.canonical_interval(interval)
+        start, end = month_range(month)
+        # Only a month whose last bar is already closed can be served from / written to the cache
+        closed = month_closed(month, interval)
+        exchange = self.cache_key(**params)
+
+        if self.cache is not None and closed:
+            columns = self.cache.get(exchange, symbol, interval, month)
+            if columns is not None:
+                return to_frame(columns, self.compact)
+
+        columns = decode_klines(self._download(symbol, interval, start, end, **params))
+        if self.cache is not None and closed:
+            self.cache.put(exchange, symbol, interval, month, columns)
+        return to_frame(columns, self.compact)
+
+    def fetch_range(self, symbol, interval, start, end, **params):
+        # Any [start, end] range (epoch ms, datetime or date string in UTC), downloaded page by page in parallel
+        return to_frame(decode_klines(self._download(symbol, self.canonical_interval(interval), to_ms(start), to_ms(end), **params)), self.compact)
+
+    def fetch_many(self, jobs, max_workers=None, **params):
+        # jobs: iterable of (symbol, interval, month), yields ((symbol, interval, month), df) as each download finishes
+        max_workers = max_workers or self.max_connections
+        fetch = lambda symbol, interval, month: self.fetch_data_month(symbol, month, interval, **params)
+        yield from fetch_many(fetch, jobs, max_workers)
+
+    def _download(self, symbol, interval, start, end, **params):
+        if self.index is not None and self.indexed(**params):
+            # Nothing to request before the symbol was listed
+            first_bar = self.index.first_bar(self, symbol, interval)
+            start = max(start, end + 1 if first_bar is None else first_bar)
+        pages = plan_pages(interval, start, end, self.limit)
+        if self.newest_first:
+            pages = pages[::-1]
+        jobs = [(symbol, interval, page_start, page_end) for page_start, page_end in pages]
+        return stitch(page for _, page in fetch_many(functools.partial(self._get_page, **params), jobs, self.page_workers))
+
+    def _get_page(self, symbol, interval, start, end, **params):
+        raise NotImplementedError
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from klines import hours_between
+
+KEYS = ('entry_date', 'exit_date', 'period', 'trade_type', 'entry_budget', 'exit_budget', 'profit',
+        'entry_price', 'exit_price', 'take_profit', 'stop_loss')
+
+
+class TradeLedger:
+    # Closed trades kept as one typed array per field, grown by doubling, instead of a dict per trade.
+    # Dates, periods and trade types are only built when asked for: to_frame() makes (and keeps until the next
+    # append) a DataFrame, iterating or indexing gives the per trade dicts with the keys the ledger was made with.
+    dtypes = {
+        'entry_index': np.int64,
+        'exit_index': np.int64,
+        'side': np.int8,  # 1 long, -1 short
+        'entry_budget': np.float64,
+        'exit_budget': np.float64,
+        'profit': np.float64,
+        'entry_price': np.float64,
+        'exit_price': np.float64,
+        'take_profit': np.float64,
+        'stop_loss': np.float64,
+    }
+
+    def __init__(self, times, keys=KEYS, capacity=64):
+        self.times = times  # 'Open Time' of the bars the indexes point into
+        self.keys = keys
+        self.n = 0
+        self.arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.dtypes.items()}
+        self._frame = None
+        self._records = None
+
+    def append(self, entry_index, exit_index, is_long, entry_budget, exit_budget, profit, entry_price, exit_price, take_profit, stop_loss):
+        if self.n == len(self.arrays['profit']):
+            for name, values in self.arrays.items():
+                grown = np.empty(2 * len(values), dtype=values.dtype)
+                grown[:self.n] = values[:self.n]
+                self.arrays[name] = grown
+        i, arrays = self.n, self.arrays
+        arrays['entry_index'][i] = entry_index
+        arrays['exit_index'][i] = exit_index
+        arrays['side'][i] = 1 if is_long else -1
+        arrays['entry_budget'][i] = entry_budget
+        arrays['exit_budget'][i] = exit_budget
+        arrays['profit'][i] = profit
+        arrays['entry_price'][i] = entry_price
+        arrays['exit_price'][i] = exit_price
+        arrays['take_profit'][i] = take_profit
+        arrays['stop_loss'][i] = stop_loss
+        self.n += 1
+        self._frame = None
+        self._records = None
+
+    def __len__(self):
+        return self.n
+
+    def column(self, name):
+        return self.arrays[name][:self.n]
+
+    def to_frame(self):
+        if self._frame is None:
+            entry_dates = self.times.iloc[self.column('entry_index')].reset_index(drop=True)
+            exit_dates = self.times.iloc[self.column('exit_index')].reset_index(drop=True)
+            self._frame = pd.DataFrame({
+                'entry_index': self.column('entry_index'),
+                'exit_index': self.column('exit_index'),
+                'entry_date': entry_dates,
+                'exit_date': exit_dates,
+                'period': hours_between(entry_dates, exit_dates),
+                'trade_type': np.where(self.column('side') == 1, 'long', 'short'),
+                **{name: self.column(name) for name in self.dtypes if name not in ('entry_index', 'exit_index', 'side')},
+            })
+        return self._frame
+
+    def _rows(self):
+        # Per trade dicts, built once and kept like the frame; callers get copies
+        if self._records is None:
+            self._records = self.to_frame()[list(self.keys)].to_dict('records')
+        return self._records
+
+    def __iter__(self):
+        return (dict(record) for record in self._rows())
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [dict(record) for record in self._rows()[i]]
+        return dict(self._rows()[i])
+
+    def total_profit(self):
+        return float(self.column('profit').sum())
+
+    def win_rate(self):
+        return float((self.column('profit') > 0).mean()) if self.n > 0 else 0.0
+
+    def peak_budget(self, initial_budget):
+        return max(float(self.column('exit_budget').max()), initial_budget) if self.n > 0 else initial_budget
+
+    def max_drawdown(self, initial_budget):
+        # Largest fall from a peak of the budget, in percent of that peak
+        budgets = np.concatenate(([initial_budget], self.column('exit_budget')))
+        peaks = np.maximum.accumulate(budgets)
+        return float(((peaks - budgets) / peaks).max() * 100)
+
+    def average_period(self):
+        return float(self.to_frame()['period'].mean()) if self.n > 0 else 0.0
@@ -4,37 +4,66 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 from binance import Binance
+from indicators import REGISTRY
+
+
+def persists(condition, n):
+    # True where condition held on this bar and the n - 1 bars before it (False without enough bars), on the last axis
+    count = np.concatenate((np.zeros(condition.shape[:-1] + (1,), dtype=np.int64), np.cumsum(condition, axis=-1)), axis=-1)
+    result = np.zeros(condition.shape, dtype=bool)
+    bars = condition.shape[-1]
+    if bars >= n:
+        result[..., n - 1:] = count[..., n:] - count[..., :bars - n + 1] == n
+    return result
+
+
+def crossovers(macd, signal_line, ema_short, ema_long, backcandles):
+    # 1 where MACD crosses above the signal line while the short EMA stayed above the long one for backcandles
+    # bars, -1 for the opposite, otherwise 0 (on the last axis)
+    cross_up = np.zeros(macd.shape, dtype=bool)
+    cross_down = np.zeros(macd.shape, dtype=bool)
+    cross_up[..., 1:] = (macd[..., 1:] > signal_line[..., 1:]) & (macd[..., :-1] < signal_line[..., :-1])
+    cross_down[..., 1:] = (macd[..., 1:] < signal_line[..., 1:]) & (macd[..., :-1] > signal_line[..., :-1])
+    signal = np.zeros(macd.shape, dtype=np.int8)
+    signal[cross_up & persists(ema_short > ema_long, backcandles)] = 1
+    signal[cross_down & persists(ema_short < ema_long, backcandles)] = -1
+    return signal
+
 
 class MACDStrategy:
-    def __init__(self, df, long_ema=50, short_ema=30, macd_slow=26, macd_fast=3, macd_smooth=9):
+    def __init__(self, df, long_ema=50, short_ema=30, macd_slow=26, macd_fast=3, macd_smooth=9, compact=False):
         self.df = df
         self.macd_slow = macd_slow
         self.macd_fast = macd_fast
         self.macd_smooth = macd_smooth
         self.backcandles = 5
+        self.compact = compact  # Keep only the columns the signals need, as float32
+
+        ema_50 = self._indicator('ema', span=long_ema)
+        ema_30 = self._indicator('ema', span=short_ema)
+        macd, signal_line, hist = self.calculate_macd(self.df['Close'])
+        if self.compact:
+            self.df['ema_50'] = ema_50.astype(np.float32)
+            self.df['ema_30'] = ema_30.astype(np.float32)
+            self.df['macd'], self.df['signal_line'] = macd.astype(np.float32), signal_line.astype(np.float32)
+        else:
+            self.df['ema_50'] = ema_50
+            self.df['ema_30'] = ema_30
+            self.df['macd'], self.df['signal_line'], self.df['hist'] = macd, signal_line, hist
 
-        self.df['ema_50'] = self.df['Close'].ewm(span=long_ema, adjust=False).mean()
-        self.df['ema_30'] = self.df['Close'].ewm(span=short_ema, adjust=False).mean()
-        self.df['macd'], self.df['signal_line'], self.df['hist'] = self.calculate_macd(self.df['Close'])
+    def _indicator(self, name, **params):
+        return pd.Series(REGISTRY.get(name, self.df['Close'], **params), index=self.df.index)
 
     def calculate_macd(self, price):
-        ema_fast = price.ewm(span=self.macd_fast, adjust=False).mean()
-        ema_slow = price.ewm(span=self.macd_slow, adjust=False).mean()
-        macd = ema_fast - ema_slow
-        signal_line = macd.ewm(span=self.macd_smooth, adjust=False).mean()
+        params = {'fast': self.macd_fast, 'slow': self.macd_slow}
+        macd = pd.Series(REGISTRY.get('macd', price, **params), index=price.index)
+        signal_line = pd.Series(REGISTRY.get('macd_signal', price, smooth=self.macd_smooth, **params), index=price.index)
         return macd, signal_line, macd - signal_line
 
     def run(self):
-        self.df['signal'] = 0
-
-        for i in range(1, len(self.df)):
-            if self.df['macd'][i] > self.df['signal_line'][i] and self.df['macd'][i-1] < self.df['signal_line'][i-1]:
-                if all(self.df['ema_30'][i-j] > self.df['ema_50'][i-j] for j in range(self.backcandles)):
-                    self.df.at[i, 'signal'] = 1
-            
-            if self.df['macd'][i] < self.df['signal_line'][i] and self.df['macd'][i-1] > self.df['signal_line'][i-1]:
-                if all(self.df['ema_30'][i-j] < self.df['ema_50'][i-j] for j in range(self.backcandles)):
-                    self.df.at[i, 'signal'] = -1
+        signal = crossovers(self.df['macd'].to_numpy(), self.df['signal_line'].to_numpy(),
+                            self.df['ema_30'].to_numpy(), self.df['ema_50'].to_numpy(), self.backcandles)
+        self.df['signal'] = signal.astype(np.int8 if self.compact else np.int64)
 
         return self.df
 
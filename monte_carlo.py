@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# Robustness of a backtest beyond its single equity path: the price move of every trade is kept, the
+# trades are reshuffled ('shuffle', same trades in another order) or drawn with replacement ('bootstrap')
+# into many paths, and every path is compounded with the backtest sizing:
+#   budget *= 1 + move * leverage * trade_percentage
+# Paths are built batch_size at a time as (paths x trades) arrays, so memory stays bounded.
+# A path is ruined once its budget falls to ruin_level x the initial budget; budgets never go below 0.
+
+
+def trade_moves(trades):
+    # Signed price move of every trade of a TradeLedger: (exit - entry) / entry for a long, the opposite for a short
+    entry_price = trades.column('entry_price')
+    exit_price = trades.column('exit_price')
+    return trades.column('side') * (exit_price - entry_price) / entry_price
+
+
+class MonteCarlo:
+    def __init__(self, moves, trade_percentage, leverage, initial_budget=100, ruin_level=0.5, seed=0):
+        self.moves = np.asarray(moves, dtype=np.float64)
+        self.trade_percentage = trade_percentage
+        self.leverage = leverage
+        self.initial_budget = initial_budget
+        self.ruin_level = ruin_level
+        self.seed = seed
+
+    def run(self, paths=10000, method='shuffle', batch_size=1000):
+        # One row per path: final_budget, peak_budget, max_drawdown (percent of the peak) and ruined
+        if method not in ('shuffle', 'bootstrap'):
+            raise ValueError(f'Unsupported method: {method}')
+        rng = np.random.default_rng(self.seed)
+        returns = np.maximum(1 + self.moves * self.leverage * self.trade_percentage, 0)
+        n = len(returns)
+        results = {name: np.empty(paths) for name in ('final_budget', 'peak_budget', 'max_drawdown')}
+        results['ruined'] = np.empty(paths, dtype=bool)
+        for start in range(0, paths, batch_size):
+            size = min(batch_size, paths - start)
+            if method == 'shuffle':
+                index = rng.permuted(np.broadcast_to(np.arange(n), (size, n)), axis=1)
+            else:
+                index = rng.integers(0, n, size=(size, n))
+            budgets = np.empty((size, n + 1))
+            budgets[:, 0] = self.initial_budget
+            np.cumprod(returns[index], axis=1, out=budgets[:, 1:])
+            budgets[:, 1:] *= self.initial_budget
+            peaks = np.maximum.accumulate(budgets, axis=1)
+            results['final_budget'][start:start + size] = budgets[:, -1]
+            results['peak_budget'][start:start + size] = peaks[:, -1]
+            results['max_drawdown'][start:start + size] = ((peaks - budgets) / peaks).max(axis=1) * 100
+            results['ruined'][start:start + size] = budgets.min(axis=1) <= self.ruin_level * self.initial_budget
+        return pd.DataFrame(results)
+
+    @staticmethod
+    def summary(result, percentiles=(5, 25, 50, 75, 95)):
+        # Percentiles of final budget and drawdown over the paths, plus the share of ruined paths
+        summary = {'paths': len(result), 'ruin_probability': float(result['ruined'].mean())}
+        for column in ('final_budget', 'max_drawdown'):
+            for p, value in zip(percentiles, np.percentile(result[column], percentiles)):
+                summary[f'{column}_p{p}'] = float(value)
+        return summary
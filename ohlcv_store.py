@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+from klines import COLUMNS, from_frame, to_frame
+from pagination import month_range, to_ms
+
+
+class OHLCVStore:
+    # Multi-year bar history kept as one fixed dtype file per column:
+    #   <path>/<exchange>/<symbol>/<interval>/<column>.bin
+    # time is int64 epoch ms, the prices and volume are float64, all little endian with no header,
+    # so every column can be memory mapped and a time range is found by binary search on time.bin.
+    # manifest.json next to the columns holds the committed row count and is replaced last on every write:
+    # rows past it are ignored, so a crash while appending leaves the previous history. Overlapping bars are
+    # written by truncating the columns at the first overlapping row and appending the merged tail; that tail is
+    # first saved as journal.npz and named in the manifest, and replayed by the next write after a crash.
+    # The manifest also keeps when fill downloaded every month, {'count': rows, 'fetched': {month: ms}}.
+    dtypes = {
+        'time': np.dtype('<i8'),
+        'open': np.dtype('<f8'),
+        'high': np.dtype('<f8'),
+        'low': np.dtype('<f8'),
+        'close': np.dtype('<f8'),
+        'volume': np.dtype('<f8'),
+    }
+
+    def __init__(self, path='.ohlcv_store', exchange='binance', compact=False):
+        self.path = path
+        self.exchange = exchange
+        self.compact = compact
+        self.lock = threading.RLock()
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.path, self.exchange, symbol, interval)
+
+    def _file(self, symbol, interval, column):
+        return os.path.join(self._dir(symbol, interval), f'{column}.bin')
+
+    def _manifest_file(self, symbol, interval):
+        return os.path.join(self._dir(symbol, interval), 'manifest.json')
+
+    def _journal_file(self, symbol, interval):
+        return os.path.join(self._dir(symbol, interval), 'journal.npz')
+
+    def manifest(self, symbol, interval):
+        path = self._manifest_file(symbol, interval)
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        # A store written before the manifest: the shortest column wins
+        sizes = []
+        for column in COLUMNS:
+            path = self._file(symbol, interval, column)
+            sizes.append(os.path.getsize(path) // self.dtypes[column].itemsize if os.path.exists(path) else 0)
+        return {'count': min(sizes)}
+
+    def _commit(self, symbol, interval, manifest):
+        path = self._manifest_file(symbol, interval)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{path}.tmp', path)
+
+    def __contains__(self, key):
+        symbol, interval = key
+        return self.count(symbol, interval) > 0
+
+    def count(self, symbol, interval):
+        # Rows committed by the manifest; with a journal left by a crash only the rows before it are intact
+        manifest = self.manifest(symbol, interval)
+        return manifest['journal'] if 'journal' in manifest else manifest['count']
+
+    def columns(self, symbol, interval):
+        # Read only memory maps of every column, nothing is read from disk until the arrays are touched
+        count = self.count(symbol, interval)
+        columns = {}
+        for column in COLUMNS:
+            if count == 0:
+                columns[column] = np.empty(0, dtype=self.dtypes[column])
+            else:
+                columns[column] = np.memmap(self._file(symbol, interval, column), dtype=self.dtypes[column], mode='r', shape=(count,))
+        return columns
+
+    def slice(self, symbol, interval, start, end):
+        # Zero copy views of the bars with start <= time <= end
+        columns = self.columns(symbol, interval)
+        lo = np.searchsorted(columns['time'], to_ms(start), side='left')
+        hi = np.searchsorted(columns['time'], to_ms(end), side='right')
+        return {column: values[lo:hi] for column, values in columns.items()}
+
+    def fetch_range(self, symbol, interval, start, end):
+        return to_frame(self.slice(symbol, interval, start, end), self.compact)
+
+    def fetch_data_month(self, symbol, month, interval):
+        start, end = month_range(month)
+        return self.fetch_range(symbol, interval, start, end)
+
+    def fetched(self, symbol, interval):
+        # month -> epoch ms its bars were downloaded at, as recorded by fill
+        return self.manifest(symbol, interval).get('fetched', {})
+
+    def write(self, symbol, interval, columns, fetched=None):
+        # fetched ({month: epoch ms}) is committed in the same manifest as the bars, even when there are none
+        if len(columns['time']) == 0 and not fetched:
+            return
+        with self.lock:
+            os.makedirs(self._dir(symbol, interval), exist_ok=True)
+            manifest = self._recover(symbol, interval)
+            count = manifest['count']
+            if len(columns['time']) > 0:
+                start = int(np.searchsorted(self.columns(symbol, interval)['time'], columns['time'][0], side='left'))
+                if start == count:
+                    # Only newer bars: appended past the committed rows, which the manifest then takes in
+                    self._write_tail(symbol, interval, start, columns)
+                else:
+                    # Overlapping or older bars: only the rows from the first overlapping one are rewritten,
+                    # sorted by time, new values win on duplicates
+                    existing = self.columns(symbol, interval)
+                    times = np.concatenate([columns['time'], existing['time'][start:]])
+                    _, index = np.unique(times, return_index=True)
+                    columns = {column: np.concatenate([np.asarray(columns[column], dtype=self.dtypes[column]), existing[column][start:]])[index]
+                               for column in COLUMNS}
+                    del existing  # the maps are closed before their files are truncated
+                    journal = self._journal_file(symbol, interval)
+                    with open(f'{journal}.tmp', 'wb') as f:
+                        np.savez(f, **columns)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(f'{journal}.tmp', journal)
+                    self._commit(symbol, interval, {**manifest, 'journal': start})
+                    self._write_tail(symbol, interval, start, columns)
+                count = start + len(columns['time'])
+            manifest = {**manifest, 'count': count}
+            if fetched:
+                manifest['fetched'] = {**manifest.get('fetched', {}), **fetched}
+            self._commit(symbol, interval, manifest)
+            if os.path.exists(self._journal_file(symbol, interval)):
+                os.remove(self._journal_file(symbol, interval))
+
+    def write_frame(self, symbol, interval, df, fetched=None):
+        self.write(symbol, interval, from_frame(df), fetched)
+
+    def fill(self, loader, symbol, interval, months):
+        # Downloads the months concurrently through loader.fetch_many and writes them in time order,
+        # so the store only ever appends. Every month is stamped with the time the download started.
+        fetched = int(time.time() * 1000)
+        frames = dict(loader.fetch_many([(symbol, interval, month) for month in months]))
+        for month in sorted(months):
+            self.write_frame(symbol, interval, frames[(symbol, interval, month)], {month: fetched})
+
+    def _recover(self, symbol, interval):
+        # Replays the journal of a write that crashed after naming it in the manifest
+        manifest = self.manifest(symbol, interval)
+        if 'journal' in manifest:
+            start = manifest.pop('journal')
+            with np.load(self._journal_file(symbol, interval)) as journal:
+                columns = {column: journal[column] for column in COLUMNS}
+            self._write_tail(symbol, interval, start, columns)
+            manifest['count'] = start + len(columns['time'])
+            self._commit(symbol, interval, manifest)
+            os.remove(self._journal_file(symbol, interval))
+        return manifest
+
+    def _write_tail(self, symbol, interval, start, columns):
+        for column in COLUMNS:
+            path = self._file(symbol, interval, column)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # Drops the rows from start, and whatever a crashed write left past the committed ones
+                f.truncate(start * self.dtypes[column].itemsize)
+                f.seek(0, os.SEEK_END)
+                np.ascontiguousarray(columns[column], dtype=self.dtypes[column]).tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
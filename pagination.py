@@ -0,0 +1,57 @@
+import time
+import datetime
+import numpy as np
+import pandas as pd
+
+from intervals import interval_ms, interval_offset_ms
+
+
+def to_ms(value):
+    # Epoch milliseconds from an int, a datetime or a date string (naive values are taken as UTC)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return int(timestamp.value // 10**6)
+
+
+def month_range(month):
+    # First and last millisecond of a 'YYYY-MM' month in UTC
+    start_date = datetime.datetime.strptime(f'{month}-01', '%Y-%m-%d')
+    end_date = (start_date + datetime.timedelta(days=31)).replace(day=1)
+    return to_ms(start_date), to_ms(end_date) - 1
+
+
+def month_closed(month, interval, at=None):
+    # True once the last bar of the month has closed (by epoch ms `at`, default now), so its bars can no longer change
+    return month_range(month)[1] + interval_ms(interval) < (time.time() * 1000 if at is None else at)
+
+
+def last_open_time(interval, end):
+    # Open time of the last bar of the exchange grid for interval opening at or before end
+    step = interval_ms(interval)
+    offset = interval_offset_ms(interval)
+    return (end - offset) // step * step + offset
+
+
+def plan_pages(interval, start, end, limit):
+    # Splits [start, end] (epoch ms, inclusive) into the minimal list of non overlapping (page_start, page_end)
+    # windows, each one holding at most `limit` bar open times of the exchange grid for `interval`
+    step = interval_ms(interval)
+    offset = interval_offset_ms(interval)
+    first = -(-(start - offset) // step) * step + offset
+    pages = []
+    while first <= end:
+        pages.append((first, min(first + (limit - 1) * step, end)))
+        first += limit * step
+    return pages
+
+
+def stitch(pages):
+    # Joins the raw kline rows of several pages in open time order, dropping bars that appear twice
+    rows = {}
+    for page in pages:
+        for row in page:
+            rows[int(row[0])] = row
+    return [rows[key] for key in sorted(rows)]
@@ -0,0 +1,31 @@
+import numpy as np
+
+from intervals import interval_ms, interval_offset_ms
+from klines import COLUMNS, from_frame, to_frame
+
+
+def resample(columns, interval):
+    # Aggregates finer bars (decode_klines / OHLCVStore columns, sorted by time) into `interval` bars
+    # on the exchange grid: first open, highest high, lowest low, last close and summed volume
+    time = np.asarray(columns['time'])
+    if len(time) == 0:
+        return {column: np.asarray(columns[column]).copy() for column in COLUMNS}
+
+    step = interval_ms(interval)
+    offset = interval_offset_ms(interval)
+    bucket = (time - offset) // step * step + offset
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(time)] - 1
+    return {
+        'time': bucket[starts],
+        'open': np.asarray(columns['open'])[starts],
+        'high': np.maximum.reduceat(np.asarray(columns['high']), starts),
+        'low': np.minimum.reduceat(np.asarray(columns['low']), starts),
+        'close': np.asarray(columns['close'])[ends],
+        'volume': np.add.reduceat(np.asarray(columns['volume']), starts),
+    }
+
+
+def resample_frame(df, interval, compact=False):
+    # Always returns a new frame, so strategies can add their columns without touching the base series
+    return to_frame(resample(from_frame(df), interval), compact)
@@ -2,14 +2,21 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from binance import Binance
+from kline_cache import KlineCache
+from symbol_index import SymbolIndex
 from bybit import Bybit
 from bb_strategy import BBStrategy
 from macd_strategy import MACDStrategy
-from backtest_gpt4 import Backtest
+from backtest_gpt4 import Backtest, run_grid
+from intervals import interval_ms
+from resample import resample_frame
+from grid_runner import GridRunner
+from walk_forward import WalkForward
+from monte_carlo import MonteCarlo, trade_moves
 
 
 class Statistics:
-    def __init__(self, budget, trade_percentage, leverage):
+    def __init__(self, budget, trade_percentage, leverage, exchange='binance', compact=False):
         self.coin_list = [
             'BTCUSDT', 'ETHUSDT', 'ADAUSDT', 
             'ATOMUSDT', 'LINKUSDT', 'BNBUSDT', 
@@ -33,8 +40,12 @@ class Statistics:
 
         self.months = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
         self.months_name = ['Янв', 'Февр', 'Март', 'Апр', 'Май', 'Июнь', 'Июль', 'Авг', 'Сент', 'Октб', 'Нояб', 'Дек']
-        self.binance = Binance()
-        self.bybit = Bybit()
+        cache = KlineCache()
+        self.index = SymbolIndex()
+        self.compact = compact
+        self.binance = Binance(cache=cache, index=self.index, compact=compact)
+        self.bybit = Bybit(cache=cache, index=self.index, compact=compact)
+        self.loader = self.bybit if exchange == 'bybit' else self.binance
         # self.bb_strategy = BBStrategy()
 
         self.params = [
@@ -66,14 +77,13 @@ class Statistics:
     
     def get_budget_per_month(self, coin, month, timeframe):
         results = []
-        df = self.binance.fetch_data_month(coin, month, timeframe)
+        df = self.loader.fetch_data_month(coin, month, timeframe)
         # bb_strategy = BBStrategy(df)
         # df = bb_strategy.run(df)
-        macd_strategy = MACDStrategy(df)
+        macd_strategy = MACDStrategy(df, compact=self.compact)
         df = macd_strategy.run()
-        for param in self.params:
-            backtest = Backtest(df, self.budget, self.trade_percentage, self.leverage, param['take'], param['stop'])
-            stats = backtest.run()
+        grid = run_grid(df, self.budget, self.trade_percentage, self.leverage, self.params)
+        for param, stats in zip(self.params, grid.to_dict('records')):
             results.append({
                 'params': f"take_{param['take']}_stop_{param['stop']}",
                 'end_budget': stats['end_budget'],
@@ -93,14 +103,20 @@ class Statistics:
         
     def get_budget_per_month_by_coins(self, month, timeframe):
         results = {f"budget_take_{param['take']}_stop_{param['stop']}": [] for param in self.params}
+        # Coins not listed yet keep the initial budget, without requesting anything
+        jobs = self.index.prune(self.loader, [(coin, timeframe, month) for coin in self.coins])
+        frames = dict(self.loader.fetch_many(jobs))
         for coin in self.coins:
-            df = self.binance.fetch_data_month(coin, month, timeframe)
-            bb_strategy = BBStrategy(df)
+            if (coin, timeframe, month) not in frames:
+                for param in self.params:
+                    results[f"budget_take_{param['take']}_stop_{param['stop']}"].append(self.budget)
+                continue
+            df = frames[(coin, timeframe, month)]
+            bb_strategy = BBStrategy(df, compact=self.compact)
             df = bb_strategy.run(df)
-            for param in self.params:
-                backtest = Backtest(df, self.budget, self.trade_percentage, self.leverage, param['take'], param['stop'])
-                stats = backtest.run()
-                results[f"budget_take_{param['take']}_stop_{param['stop']}"].append(stats['end_budget'])
+            grid = run_grid(df, self.budget, self.trade_percentage, self.leverage, self.params)
+            for param, end_budget in zip(self.params, grid['end_budget'].tolist()):
+                results[f"budget_take_{param['take']}_stop_{param['stop']}"].append(end_budget)
         
         x = np.arange(len(self.coins))
         width = 0.15
@@ -120,15 +136,47 @@ class Statistics:
         plt.show()
 
 
+    def get_sweep(self, year, strategies=('bb',), max_workers=None):
+        # self.coins x months of the year x self.timeframes x strategies x self.params on every core, one row per run
+        spec = {
+            'coins': self.coins,
+            'months': [f'{year}-{month}' for month in self.months],
+            'timeframes': self.timeframes,
+            'strategies': list(strategies),
+            'params': self.params,
+        }
+        runner = GridRunner(self.loader, index=self.index, budget=self.budget, trade_percentage=self.trade_percentage, leverage=self.leverage, max_workers=max_workers)
+        return runner.run_frame(spec)
+
+    def get_walk_forward(self, coins, timeframe, year, strategy='bb', indicator_params=None, in_sample=3, out_of_sample=1, anchored=False):
+        # Out-of-sample results of self.params picked month window by month window, one row per coin and window
+        walk_forward = WalkForward(self.loader, strategy, indicator_params, self.params, self.budget, self.trade_percentage, self.leverage,
+                                   in_sample, out_of_sample, anchored, compact=self.compact)
+        return walk_forward.run_many(coins, timeframe, [f'{year}-{month}' for month in self.months])
+
+    def get_monte_carlo(self, coin, month, timeframe, params, paths=10000, method='bootstrap', seed=0):
+        # Distribution of final budget, drawdown and ruin over reordered or resampled trades of one backtest
+        df = self.loader.fetch_data_month(coin, month, timeframe)
+        df = BBStrategy(df, compact=self.compact).run(df)
+        stats = Backtest(df, self.budget, self.trade_percentage, self.leverage, params['take'], params['stop']).run()
+        monte_carlo = MonteCarlo(trade_moves(stats['trades']), self.trade_percentage, self.leverage, self.budget, seed=seed)
+        return MonteCarlo.summary(monte_carlo.run(paths, method))
+
     def get_budget_by_timestamp(self):
         ...   
     
     def get_budget_per_year_for_coins(self, year, timeframe, params):
         results = {coin: [] for coin in self.coins}
+        # Months before a coin was listed keep the initial budget, without requesting anything
+        jobs = self.index.prune(self.loader, [(coin, timeframe, f'{year}-{month}') for coin in self.coins for month in self.months])
+        frames = dict(self.loader.fetch_many(jobs))
         for coin in self.coins:
             for month in self.months:
-                df = self.binance.fetch_data_month(coin, f'{year}-{month}', timeframe)
-                bb_strategy = BBStrategy(df)
+                if (coin, timeframe, f'{year}-{month}') not in frames:
+                    results[coin].append(self.budget)
+                    continue
+                df = frames[(coin, timeframe, f'{year}-{month}')]
+                bb_strategy = BBStrategy(df, compact=self.compact)
                 df = bb_strategy.run(df)
                 backtest = Backtest(df, self.budget, self.trade_percentage, self.leverage, params['take'], params['stop'])
                 stats = backtest.run()
@@ -156,10 +204,17 @@ class Statistics:
 
     def get_budget_per_year_for_timeframes(self, coin, year, params):
         results = {timeframe: [] for timeframe in self.timeframes}
+        # Every timeframe is built from one download of the finest one
+        base = min(self.timeframes, key=interval_ms)
+        jobs = self.index.prune(self.loader, [(coin, base, f'{year}-{month}') for month in self.months])
+        frames = dict(self.loader.fetch_many(jobs))
         for timeframe in self.timeframes:
             for month in self.months:
-                df = self.binance.fetch_data_month(coin, f'{year}-{month}', timeframe)
-                bb_strategy = BBStrategy(df)
+                if (coin, base, f'{year}-{month}') not in frames:
+                    results[timeframe].append(self.budget)
+                    continue
+                df = resample_frame(frames[(coin, base, f'{year}-{month}')], timeframe, self.compact)
+                bb_strategy = BBStrategy(df, compact=self.compact)
                 df = bb_strategy.run(df)
                 backtest = Backtest(df, self.budget, self.trade_percentage, self.leverage, params['take'], params['stop'])
                 stats = backtest.run()
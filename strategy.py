@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np 
 import plotly.graph_objects as go
 
+from indicators import REGISTRY
+
 
 class Strategy:
     def __init__(self, df, initial_budget, window=20, no_of_std=2, ema_period=50):
@@ -16,7 +18,7 @@ class Strategy:
         self._calculate_indicator()
 
     def _calculate_indicator(self):
-        self.df['ema50'] = self.df['Close'].ewm(span=50, adjust=False).mean()
+        self.df['ema50'] = pd.Series(REGISTRY.get('ema', self.df['Close'], span=50), index=self.df.index)
 
     def generate_signals(self):
         signals = []
@@ -0,0 +1,304 @@
+import math
+from collections import deque
+import numpy as np
+
+# Indicators and signal rules updated one bar at a time in O(1) time and memory, for a live feed.
+# Every update repeats the arithmetic of the pandas kernels behind the batch versions (ewm with adjust=False,
+# rolling mean and variance with their Kahan compensated add/remove), so replaying a history bar by bar gives
+# exactly the values of the indicators registry and exactly the signals of BBStrategy / MACDStrategy.
+#   strategy = StreamingBBStrategy()
+#   for close in closes:
+#       signal = strategy.update(close)  # 1 long, -1 short, 0 nothing
+
+
+def _value(value):
+    # pandas works on float64 and reads infinities as missing values
+    value = float(value)
+    return math.nan if math.isinf(value) else value
+
+
+def _float32(value):
+    # A compact (float32) column value, compared as an exact float
+    return float(np.float32(value))
+
+
+def _sqrt(value):
+    return math.sqrt(value) if value > 0 else (0.0 if value == value else math.nan)
+
+
+class StreamingEMA:
+    # Series.ewm(span=span, adjust=False).mean()
+    def __init__(self, span):
+        self.alpha = 1. / (1. + (span - 1) / 2.0)
+        self.weighted = None
+        self.old_wt = 1.
+        self.value = math.nan
+
+    def update(self, value):
+        cur = _value(value)
+        if self.weighted is None:
+            self.weighted = cur
+        elif self.weighted == self.weighted:
+            self.old_wt *= 1. - self.alpha
+            if cur == cur:
+                if self.weighted != cur:
+                    self.weighted = (self.old_wt * self.weighted + self.alpha * cur) / (self.old_wt + self.alpha)
+                self.old_wt = 1.
+        elif cur == cur:
+            self.weighted = cur
+        self.value = self.weighted
+        return self.value
+
+
+class StreamingEWMStd:
+    # Series.ewm(span=span, adjust=False).std()
+    def __init__(self, span):
+        self.alpha = 1. / (1. + (span - 1) / 2.0)
+        self.mean = None
+        self.nobs = 0
+        self.cov = 0.
+        self.sum_wt = 1.
+        self.sum_wt2 = 1.
+        self.old_wt = 1.
+        self.value = math.nan
+
+    def update(self, value):
+        cur = _value(value)
+        factor, new_wt = 1. - self.alpha, self.alpha
+        self.nobs += cur == cur
+        if self.mean is None:
+            self.mean = cur
+            self.value = math.nan
+            return self.value
+        if self.mean == self.mean:
+            self.sum_wt *= factor
+            self.sum_wt2 *= factor * factor
+            self.old_wt *= factor
+            if cur == cur:
+                old_mean = self.mean
+                if self.mean != cur:
+                    self.mean = ((self.old_wt * old_mean) + (new_wt * cur)) / (self.old_wt + new_wt)
+                self.cov = ((self.old_wt * (self.cov + ((old_mean - self.mean) * (old_mean - self.mean)))) + (new_wt * ((cur - self.mean) * (cur - self.mean)))) / (self.old_wt + new_wt)
+                self.sum_wt += new_wt
+                self.sum_wt2 += new_wt * new_wt
+                self.old_wt += new_wt
+                self.sum_wt /= self.old_wt
+                self.sum_wt2 /= self.old_wt * self.old_wt
+                self.old_wt = 1.
+        elif cur == cur:
+            self.mean = cur
+        variance = math.nan
+        if self.nobs >= 1:
+            numerator = self.sum_wt * self.sum_wt
+            denominator = numerator - self.sum_wt2
+            if denominator > 0:
+                variance = (numerator / denominator) * self.cov
+        self.value = _sqrt(variance)
+        return self.value
+
+
+class _Rolling:
+    # Fixed window of the last window values, the oldest one removed before the newest is added
+    def __init__(self, window, min_periods=None):
+        self.window = window
+        self.min_periods = max(window if min_periods is None else min_periods, 1)
+        self.values = deque()
+        self.value = math.nan
+
+    def update(self, value):
+        value = _value(value)
+        if self.window <= 1 or not self.values:
+            self.values.clear()
+            self.reset(value)
+        elif len(self.values) == self.window:
+            self.remove(self.values.popleft())
+        self.values.append(value)
+        self.add(value)
+        self.value = self.result()
+        return self.value
+
+
+class StreamingMean(_Rolling):
+    # Series.rolling(window=window, min_periods=min_periods).mean()
+    def reset(self, value):
+        self.sum_x = self.compensation_add = self.compensation_remove = 0.
+        self.nobs = self.neg_ct = self.same = 0
+        self.prev_value = value
+
+    def add(self, val):
+        if val == val:
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1, val) < 0:
+                self.neg_ct += 1
+            self.same = self.same + 1 if val == self.prev_value else 1
+            self.prev_value = val
+
+    def remove(self, val):
+        if val == val:
+            self.nobs -= 1
+            y = - val - self.compensation_remove
+            t = self.sum_x + y
+            self.compensation_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1, val) < 0:
+                self.neg_ct -= 1
+
+    def result(self):
+        if self.nobs >= self.min_periods and self.nobs > 0:
+            result = self.sum_x / self.nobs
+            if self.same >= self.nobs:
+                result = self.prev_value
+            elif self.neg_ct == 0 and result < 0:
+                result = 0.
+            elif self.neg_ct == self.nobs and result > 0:
+                result = 0.
+            return result
+        return math.nan
+
+
+class StreamingStd(_Rolling):
+    # Series.rolling(window=window, min_periods=min_periods).std(ddof=ddof), Welford's method
+    def __init__(self, window, min_periods=None, ddof=1):
+        super().__init__(window, min_periods)
+        self.ddof = ddof
+
+    def reset(self, value):
+        self.mean_x = self.ssqdm_x = self.nobs = self.compensation_add = self.compensation_remove = 0.
+        self.same = 0
+        self.prev_value = value
+
+    def add(self, val):
+        if val != val:
+            return
+        self.nobs += 1
+        self.same = self.same + 1 if val == self.prev_value else 1
+        self.prev_value = val
+        prev_mean = self.mean_x - self.compensation_add
+        y = val - self.compensation_add
+        t = y - self.mean_x
+        self.compensation_add = t + self.mean_x - y
+        self.mean_x = self.mean_x + t / self.nobs
+        self.ssqdm_x = self.ssqdm_x + (val - prev_mean) * (val - self.mean_x)
+
+    def remove(self, val):
+        if val == val:
+            self.nobs -= 1
+            if self.nobs:
+                prev_mean = self.mean_x - self.compensation_remove
+                y = val - self.compensation_remove
+                t = y - self.mean_x
+                self.compensation_remove = t + self.mean_x - y
+                self.mean_x = self.mean_x - t / self.nobs
+                self.ssqdm_x = self.ssqdm_x - (val - prev_mean) * (val - self.mean_x)
+            else:
+                self.mean_x = self.ssqdm_x = 0.
+
+    def result(self):
+        if self.nobs >= self.min_periods and self.nobs > self.ddof:
+            if self.nobs == 1 or self.same >= self.nobs:
+                return 0.
+            return _sqrt(self.ssqdm_x / (self.nobs - self.ddof))
+        return math.nan
+
+
+class StreamingMACD:
+    # update() gives (macd, signal_line, histogram) as MACDStrategy.calculate_macd
+    def __init__(self, fast=3, slow=26, smooth=9):
+        self.ema_fast = StreamingEMA(fast)
+        self.ema_slow = StreamingEMA(slow)
+        self.signal_line = StreamingEMA(smooth)
+
+    def update(self, close):
+        macd = self.ema_fast.update(close) - self.ema_slow.update(close)
+        signal_line = self.signal_line.update(macd)
+        return macd, signal_line, macd - signal_line
+
+
+class StreamingATR:
+    # indicators.average_true_range: mean of the true range over period bars (fewer at the start).
+    # The true range is taken in the type of the prices given, as the batch one is in the frame's dtype.
+    def __init__(self, period=14):
+        self.mean = StreamingMean(period, min_periods=1)
+        self.prev_close = None
+        self.true_range = math.nan
+
+    def update(self, high, low, close):
+        ranges = [high - low]
+        if self.prev_close is not None:
+            ranges += [abs(high - self.prev_close), abs(low - self.prev_close)]
+        ranges = [value for value in ranges if value == value]
+        self.true_range = max(ranges) if ranges else math.nan
+        self.prev_close = close
+        return self.mean.update(self.true_range)
+
+
+class StreamingBBStrategy:
+    # BBStrategy's signal for each new close
+    def __init__(self, ema_fast=30, ema_slow=50, bb_ma='SMA', bb_window=15, bb_std=1.5, compact=False):
+        if bb_ma == 'SMA':
+            self.mean, self.std = StreamingMean(bb_window), StreamingStd(bb_window)
+        elif bb_ma == 'EMA':
+            self.mean, self.std = StreamingEMA(bb_window), StreamingEWMStd(bb_window)
+        else:
+            raise ValueError(f'Unsupported bb_ma: {bb_ma}')
+        self.backcandles = 7
+        self.ema_fast = StreamingEMA(ema_fast)
+        self.ema_slow = StreamingEMA(ema_slow)
+        self.bb_std = bb_std
+        self.cast = _float32 if compact else float
+        self.trend = deque()  # (fast > slow, fast < slow) of the last backcandles bars
+        self.above = self.below = 0
+
+    def update(self, close):
+        close = float(close)
+        up = self.above == len(self.trend)
+        down = self.below == len(self.trend)
+        mean, std = self.mean.update(close), self.std.update(close)
+        signal = 0
+        if up and close <= self.cast(mean - (std * self.bb_std)):
+            signal = 1
+        elif not up and down and close >= self.cast(mean + (std * self.bb_std)):
+            signal = -1
+
+        fast, slow = self.cast(self.ema_fast.update(close)), self.cast(self.ema_slow.update(close))
+        self.trend.append((fast > slow, fast < slow))
+        self.above += fast > slow
+        self.below += fast < slow
+        if len(self.trend) > self.backcandles:
+            above, below = self.trend.popleft()
+            self.above -= above
+            self.below -= below
+        return signal
+
+
+class StreamingMACDStrategy:
+    # MACDStrategy's signal for each new close
+    def __init__(self, long_ema=50, short_ema=30, macd_slow=26, macd_fast=3, macd_smooth=9, compact=False):
+        self.backcandles = 5
+        self.ema_long = StreamingEMA(long_ema)
+        self.ema_short = StreamingEMA(short_ema)
+        self.macd = StreamingMACD(macd_fast, macd_slow, macd_smooth)
+        self.cast = _float32 if compact else float
+        self.previous = None  # (macd, signal_line) of the previous bar
+        self.above = self.below = 0  # bars in a row with the short EMA above / below the long one
+
+    def update(self, close):
+        ema_long, ema_short = self.cast(self.ema_long.update(close)), self.cast(self.ema_short.update(close))
+        macd, signal_line, _ = self.macd.update(close)
+        macd, signal_line = self.cast(macd), self.cast(signal_line)
+        self.above = self.above + 1 if ema_short > ema_long else 0
+        self.below = self.below + 1 if ema_short < ema_long else 0
+
+        signal = 0
+        if self.previous is not None:
+            previous_macd, previous_signal_line = self.previous
+            if macd > signal_line and previous_macd < previous_signal_line and self.above >= self.backcandles:
+                signal = 1
+            if macd < signal_line and previous_macd > previous_signal_line and self.below >= self.backcandles:
+                signal = -1
+        self.previous = (macd, signal_line)
+        return signal
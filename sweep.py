@@ -0,0 +1,97 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+from indicators import REGISTRY
+from bb_strategy import trend, band_signals
+from macd_strategy import crossovers
+from backtest_gpt4 import run_grid
+from touch_index import TouchIndex
+
+# Signals of a strategy for every combination of its indicator params in one pass, as a (combinations x bars)
+# int8 matrix holding for each combination the signal BBStrategy / MACDStrategy give on their own.
+# Every indicator is computed once per distinct span or window, as a family (params x bars) from the shared
+# REGISTRY, and the signal rules run on whole families at once.
+#   combos, signals = bb_signals(df, ema_fast=[20, 30], ema_slow=[50], bb_window=[15, 20], bb_std=[1.5, 2.0])
+#   result = run_signal_grid(df, combos, signals, 100, 0.2, 20, [{'take': 2.3, 'stop': 1.8}])
+# result has a row per (combination, take/stop params) with the indicator params in front of the run_grid columns.
+
+BANDS = {
+    'SMA': ('sma', 'rolling_std', 'window'),
+    'EMA': ('ema', 'ewm_std', 'span'),
+}
+
+
+def combinations(**params):
+    # Every combination of the params as a dict, in itertools.product order; a scalar is a single value
+    values = [value if isinstance(value, (list, tuple, np.ndarray)) else [value] for value in params.values()]
+    return [dict(zip(params, combination)) for combination in itertools.product(*values)]
+
+
+def _rows(values):
+    # Distinct values in order and the row of each of them
+    values = list(dict.fromkeys(values))
+    return values, {value: row for row, value in enumerate(values)}
+
+
+def bb_signals(df, ema_fast=30, ema_slow=50, bb_ma='SMA', bb_window=15, bb_std=1.5, compact=False, backcandles=7):
+    combos = combinations(ema_fast=ema_fast, ema_slow=ema_slow, bb_ma=bb_ma, bb_window=bb_window, bb_std=bb_std)
+    for combo in combos:
+        if combo['bb_ma'] not in BANDS:
+            raise ValueError(f"Unsupported bb_ma: {combo['bb_ma']}")
+    dtype = np.float32 if compact else np.float64
+    close = df['Close']
+
+    # Trend of every distinct (ema_fast, ema_slow) pair
+    spans, span_row = _rows([combo['ema_fast'] for combo in combos] + [combo['ema_slow'] for combo in combos])
+    emas = REGISTRY.family('ema', close, span=spans).astype(dtype)
+    pairs, pair_row = _rows([(combo['ema_fast'], combo['ema_slow']) for combo in combos])
+    trends = trend(emas[[span_row[fast] for fast, _ in pairs]], emas[[span_row[slow] for _, slow in pairs]], backcandles).astype(np.int8)
+
+    # Every distinct band against all the trends it is combined with
+    signals = np.empty((len(combos), len(close)), dtype=np.int8)
+    bands, _ = _rows([(combo['bb_ma'], combo['bb_window'], combo['bb_std']) for combo in combos])
+    for ma, window, std in bands:
+        mean_name, std_name, param = BANDS[ma]
+        mean = REGISTRY.get(mean_name, close, **{param: window})
+        deviation = REGISTRY.get(std_name, close, **{param: window})
+        upper = (mean + deviation * std).astype(dtype)
+        lower = (mean - deviation * std).astype(dtype)
+        rows = [i for i, combo in enumerate(combos) if (combo['bb_ma'], combo['bb_window'], combo['bb_std']) == (ma, window, std)]
+        pair_rows = [pair_row[(combos[i]['ema_fast'], combos[i]['ema_slow'])] for i in rows]
+        signals[rows] = band_signals(trends[pair_rows], close.to_numpy(), lower, upper)
+    return combos, signals
+
+
+def macd_signals(df, long_ema=50, short_ema=30, macd_slow=26, macd_fast=3, macd_smooth=9, compact=False, backcandles=5):
+    combos = combinations(long_ema=long_ema, short_ema=short_ema, macd_slow=macd_slow, macd_fast=macd_fast, macd_smooth=macd_smooth)
+    dtype = np.float32 if compact else np.float64
+    close = df['Close']
+
+    spans, span_row = _rows([combo['long_ema'] for combo in combos] + [combo['short_ema'] for combo in combos])
+    emas = REGISTRY.family('ema', close, span=spans).astype(dtype)
+
+    # Every distinct MACD against all the EMA pairs it is combined with
+    signals = np.empty((len(combos), len(close)), dtype=np.int8)
+    macds, _ = _rows([(combo['macd_fast'], combo['macd_slow'], combo['macd_smooth']) for combo in combos])
+    for fast, slow, smooth in macds:
+        rows = [i for i, combo in enumerate(combos) if (combo['macd_fast'], combo['macd_slow'], combo['macd_smooth']) == (fast, slow, smooth)]
+        shape = (len(rows), len(close))
+        macd = np.broadcast_to(REGISTRY.get('macd', close, fast=fast, slow=slow).astype(dtype), shape)
+        signal_line = np.broadcast_to(REGISTRY.get('macd_signal', close, fast=fast, slow=slow, smooth=smooth).astype(dtype), shape)
+        short = emas[[span_row[combos[i]['short_ema']] for i in rows]]
+        long = emas[[span_row[combos[i]['long_ema']] for i in rows]]
+        signals[rows] = crossovers(macd, signal_line, short, long, backcandles)
+    return combos, signals
+
+
+def run_signal_grid(df, combos, signals, initial_budget, trade_percentage, leverage, params):
+    # run_grid over the take/stop params for every row of a signal matrix, sharing one touch index of the bars
+    index = TouchIndex(df['High'].to_numpy(dtype=np.float64), df['Low'].to_numpy(dtype=np.float64))
+    frames = []
+    for combo, signal in zip(combos, signals):
+        result = run_grid(df, initial_budget, trade_percentage, leverage, params, signal=signal, index=index)
+        for column, (name, value) in enumerate(combo.items()):
+            result.insert(column, name, value)
+        frames.append(result)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -0,0 +1,78 @@
+import os
+import json
+import time
+import threading
+
+from pagination import month_range
+
+
+class SymbolIndex:
+    # Local metadata for every symbol a loader has seen, kept in one json file:
+    #   {exchange: {symbol: {'onboard': ms, 'tick_size': float, 'first_bar': {interval: ms}, 'unlisted': {interval: ms}}}}
+    # Missing entries are fetched from the exchange once and written back, so after the first sweep
+    # months before a symbol was listed are skipped without any request. A symbol without bars yet is only
+    # remembered with the time it was checked and asked again after recheck_after seconds, as it may list later.
+    # A failed request raises and nothing is stored.
+    def __init__(self, path='.symbol_index.json', recheck_after=24 * 3600):
+        self.path = path
+        self.recheck_after = recheck_after
+        self.lock = threading.RLock()
+        self.data = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+
+    def save(self):
+        with self.lock:
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def _symbol(self, loader, symbol):
+        return self.data.setdefault(loader.name, {}).setdefault(symbol, {'first_bar': {}})
+
+    def refresh(self, loader):
+        # Onboard date and tick size of every symbol listed on the exchange
+        info = loader.symbols_info()
+        with self.lock:
+            for symbol, fields in info.items():
+                self._symbol(loader, symbol).update(fields)
+            self.save()
+        return info
+
+    def first_bar(self, loader, symbol, interval):
+        # Open time of the first bar of a symbol, None if the exchange has no data for it
+        now = int(time.time() * 1000)
+        with self.lock:
+            entry = self._symbol(loader, symbol)
+            if entry['first_bar'].get(interval) is not None:
+                return entry['first_bar'][interval]
+            checked = entry.get('unlisted', {}).get(interval)
+            if checked is not None and now - checked < self.recheck_after * 1000:
+                return None
+        first_bar = loader.first_bar_time(symbol, interval)
+        with self.lock:
+            entry = self._symbol(loader, symbol)
+            if first_bar is None:
+                entry.setdefault('unlisted', {})[interval] = now
+            else:
+                entry['first_bar'][interval] = first_bar
+                entry.get('unlisted', {}).pop(interval, None)
+            self.save()
+        return first_bar
+
+    def tick_size(self, loader, symbol):
+        with self.lock:
+            if 'tick_size' not in self._symbol(loader, symbol):
+                self.refresh(loader)
+            return self._symbol(loader, symbol).get('tick_size')
+
+    def listed(self, loader, symbol, interval, month):
+        # False when the whole month is before the first bar of the symbol
+        first_bar = self.first_bar(loader, symbol, interval)
+        return first_bar is not None and month_range(month)[1] >= first_bar
+
+    def prune(self, loader, jobs):
+        # Drops the (symbol, interval, month) jobs that can only return an empty frame
+        return [job for job in jobs if self.listed(loader, *job)]
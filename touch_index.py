@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class TouchIndex:
+    # Answers "first bar at or after start where High >= upper or Low <= lower" without walking the bars:
+    # High maxima and Low minima of fixed size blocks, plus a sparse table over the blocks
+    # (level j holds the extremes of 2**j consecutive blocks). A query checks the rest of its own block,
+    # skips every block that cannot touch either level by binary lifting on the table and scans the one
+    # block where the touch is, so it costs O(block + log(bars / block)) however long the trade is held.
+    # Pass upper=np.inf or lower=-np.inf to look at one side only. NaN prices never touch, like in a bar loop.
+    def __init__(self, high, low, block=64):
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.n = len(self.high)
+        self.block = block
+        blocks = -(-self.n // block)
+        pad = blocks * block - self.n
+        high = np.concatenate([np.where(np.isnan(self.high), -np.inf, self.high), np.full(pad, -np.inf)])
+        low = np.concatenate([np.where(np.isnan(self.low), np.inf, self.low), np.full(pad, np.inf)])
+        self.maxs = [high.reshape(blocks, block).max(axis=1)]
+        self.mins = [low.reshape(blocks, block).min(axis=1)]
+        width = 1
+        while 2 * width <= blocks:
+            self.maxs.append(np.maximum(self.maxs[-1][:-width], self.maxs[-1][width:]))
+            self.mins.append(np.minimum(self.mins[-1][:-width], self.mins[-1][width:]))
+            width *= 2
+
+    @classmethod
+    def from_frame(cls, df, block=64):
+        return cls(df['High'].to_numpy(dtype=np.float64), df['Low'].to_numpy(dtype=np.float64), block)
+
+    def first_high_at_or_above(self, start, level):
+        return self.first_touch(start, level, -np.inf)
+
+    def first_low_at_or_below(self, start, level):
+        return self.first_touch(start, np.inf, level)
+
+    def first_touch(self, start, upper, lower):
+        # First index >= start with High >= upper or Low <= lower, -1 if none
+        upper, lower = (np.inf if np.isnan(upper) else upper), (-np.inf if np.isnan(lower) else lower)
+        if start >= self.n:
+            return -1
+        b = start // self.block + 1
+        end = min(b * self.block, self.n)
+        hits = np.flatnonzero((self.high[start:end] >= upper) | (self.low[start:end] <= lower))
+        if len(hits) > 0:
+            return start + int(hits[0])
+        for j in range(len(self.maxs) - 1, -1, -1):
+            if b < len(self.maxs[j]) and self.maxs[j][b] < upper and self.mins[j][b] > lower:
+                b += 1 << j
+        if b >= len(self.maxs[0]):
+            return -1
+        start = b * self.block
+        end = min(start + self.block, self.n)
+        hits = np.flatnonzero((self.high[start:end] >= upper) | (self.low[start:end] <= lower))
+        return start + int(hits[0])
+
+    def first_touch_many(self, starts, upper, lower, probe=16):
+        # first_touch for arrays of starts and levels at once. Most trades end within a few bars,
+        # so the first probe bars of every query are checked in one block before using the table.
+        starts = np.asarray(starts, dtype=np.int64)
+        # A NaN level is never touched
+        upper = np.asarray(upper, dtype=np.float64)
+        lower = np.asarray(lower, dtype=np.float64)
+        upper = np.broadcast_to(np.where(np.isnan(upper), np.inf, upper), starts.shape)
+        lower = np.broadcast_to(np.where(np.isnan(lower), -np.inf, lower), starts.shape)
+        result = np.full(len(starts), -1, dtype=np.int64)
+        if self.n == 0 or len(starts) == 0:
+            return result
+
+        def scan(rows, lo, hi):
+            # First touch of every row within [lo, hi), stored in result; returns the rows without one
+            width = int((hi - lo).max()) if len(rows) > 0 else 0
+            if width <= 0:
+                return rows
+            index = lo[:, None] + np.arange(width)
+            inside = index < hi[:, None]
+            index = np.minimum(index, self.n - 1)
+            hit = ((self.high[index] >= upper[rows, None]) | (self.low[index] <= lower[rows, None])) & inside
+            found = hit.any(axis=1)
+            result[rows[found]] = index[found, hit[found].argmax(axis=1)]
+            return rows[~found]
+
+        rows = np.flatnonzero(starts < self.n)
+        block_end = np.minimum((starts[rows] // self.block + 1) * self.block, self.n)
+        probe_end = np.minimum(starts[rows] + probe, block_end)
+        rows = scan(rows, starts[rows], probe_end)
+        block_end = np.minimum((starts[rows] // self.block + 1) * self.block, self.n)
+        rows = scan(rows, np.minimum(starts[rows] + probe, block_end), block_end)
+
+        b = starts[rows] // self.block + 1
+        for j in range(len(self.maxs) - 1, -1, -1):
+            fits = b < len(self.maxs[j])
+            at = np.minimum(b, len(self.maxs[j]) - 1)
+            skip = fits & (self.maxs[j][at] < upper[rows]) & (self.mins[j][at] > lower[rows])
+            b += skip.astype(np.int64) << j
+        touched = b < len(self.maxs[0])
+        rows, b = rows[touched], b[touched]
+        scan(rows, b * self.block, np.minimum(b * self.block + self.block, self.n))
+        return result
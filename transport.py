@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from urllib.parse import urlsplit, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from downloader import make_session
+
+# Every exchange client sends its requests through a transport with a single get(url, params) method:
+#   HttpTransport      - the live exchange over a pooled keep-alive session
+#   RecordingTransport - forwards to another transport and writes every response to disk
+#   ReplayTransport    - answers from a recording, with optional latency and 429 rate limit responses
+# serve_replay() puts a ReplayTransport behind a local HTTP server, so a client with base_url pointing
+# at it runs the whole fetch -> strategy -> backtest pipeline offline over real sockets.
+
+
+def request_key(url, params=None):
+    # Same key for the same request whatever host it was sent to (None params are dropped, like requests does)
+    prepared = requests.Request('GET', url, params={k: v for k, v in (params or {}).items() if v is not None}).prepare()
+    parts = urlsplit(prepared.url)
+    query = '&'.join(sorted(parts.query.split('&'))) if parts.query else ''
+    return hashlib.sha1(f'{parts.path}?{query}'.encode()).hexdigest()
+
+
+def make_response(url, status_code, body, headers=None):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.encoding = 'utf-8'
+    response._content = body.encode() if isinstance(body, str) else body
+    response.headers['Content-Type'] = 'application/json'
+    response.headers.update(headers or {})
+    return response
+
+
+class HttpTransport:
+    # At most max_connections requests are in flight at once, whatever thread pools (months, pages) call get(),
+    # so the keep-alive pool is never exceeded and connections are reused instead of discarded
+    def __init__(self, max_connections=10):
+        self.session = make_session(max_connections)
+        self.limiter = threading.BoundedSemaphore(max_connections)
+
+    def get(self, url, params=None):
+        with self.limiter:
+            return self.session.get(url, params=params)
+
+
+class RecordingTransport:
+    def __init__(self, path, inner=None):
+        self.path = path
+        self.inner = inner or HttpTransport()
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, url, params=None):
+        response = self.inner.get(url, params=params)
+        # Rate limit answers are not part of the dataset
+        if response.status_code not in (418, 429):
+            record = {'url': url, 'params': params, 'status_code': response.status_code, 'body': response.text}
+            path = os.path.join(self.path, f'{request_key(url, params)}.json')
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(record, f)
+            os.replace(f'{path}.tmp', path)
+        return response
+
+
+class ReplayTransport:
+    def __init__(self, path, latency=0.0, rate_limit_every=0, retry_after=1):
+        self.path = path
+        self.latency = latency                    # seconds added to every request
+        self.rate_limit_every = rate_limit_every  # every n-th request is answered with 429, 0 disables it
+        self.retry_after = retry_after
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None):
+        with self.lock:
+            self.requests += 1
+            limited = self.rate_limit_every > 0 and self.requests % self.rate_limit_every == 0
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if limited:
+            body = json.dumps({'code': -1003, 'msg': 'Too many requests'})
+            return make_response(url, 429, body, {'Retry-After': str(self.retry_after)})
+
+        path = os.path.join(self.path, f'{request_key(url, params)}.json')
+        if not os.path.exists(path):
+            body = json.dumps({'code': -1, 'msg': f'Request not recorded: {url} {params}'})
+            return make_response(url, 404, body)
+        with open(path) as f:
+            record = json.load(f)
+        return make_response(url, record['status_code'], record['body'])
+
+
+def serve_replay(transport, host='127.0.0.1', port=0):
+    # Local stand-in exchange answering from a ReplayTransport, returns the running server and its base url
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            response = transport.get(f'http://{host}{parts.path}', params=dict(parse_qsl(parts.query)))
+            self.send_response(response.status_code)
+            for name, value in response.headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(response.content)))
+            self.end_headers()
+            self.wfile.write(response.content)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from backtest_gpt4 import run_grid
+from grid_runner import STRATEGIES
+from pagination import month_range
+
+# Walk-forward optimization: the months are cut into in-sample / out-of-sample windows
+#   rolling  - in_sample months, then the next out_of_sample months, moved out_of_sample months at a time
+#   anchored - the same, but every in-sample window starts at the first month
+# In every window all the indicator param sets x take/stop params are run on the in-sample bars, the best
+# one by metric is kept and scored on the out-of-sample bars that follow.
+# The bars of all the months are downloaded once and every indicator param set is run once over the whole
+# history, so indicators are warmed up across window boundaries and windows only slice the signals.
+# Grid results are memoized per (indicator param set, bar range), a range met again is not run twice.
+
+
+class WalkForward:
+    def __init__(self, loader, strategy='bb', indicator_params=None, params=None, budget=100, trade_percentage=0.2, leverage=20,
+                 in_sample=3, out_of_sample=1, anchored=False, metric='end_budget', compact=False):
+        self.loader = loader
+        self.strategy = strategy
+        self.indicator_params = indicator_params or [{}]  # kwargs of the strategy class
+        self.params = params or [{'take': 2.3, 'stop': 1.8}]
+        self.budget = budget
+        self.trade_percentage = trade_percentage
+        self.leverage = leverage
+        self.in_sample = in_sample
+        self.out_of_sample = out_of_sample
+        self.anchored = anchored
+        self.metric = metric
+        self.compact = compact
+        self.history = {}  # (symbol, interval, months) -> bars of all the months
+        self.signals = {}  # (symbol, interval, months, indicator key) -> frame with signals
+        self.results = {}  # (symbol, interval, months, indicator key, lo, hi, params) -> run_grid result
+
+    def windows(self, months):
+        # [(in_sample_months, out_of_sample_months)] over the sorted months
+        months = sorted(months)
+        windows = []
+        start = 0
+        while start + self.in_sample + self.out_of_sample <= len(months):
+            split = start + self.in_sample
+            windows.append((months[0 if self.anchored else start:split], months[split:split + self.out_of_sample]))
+            start += self.out_of_sample
+        return windows
+
+    def _history(self, symbol, interval, months):
+        frames = dict(self.loader.fetch_many([(symbol, interval, month) for month in months]))
+        return pd.concat([frames[(symbol, interval, month)] for month in months], ignore_index=True)
+
+    def _signals(self, symbol, interval, months, indicator):
+        key = (symbol, interval, months, tuple(sorted(indicator.items())))
+        if key not in self.signals:
+            if (symbol, interval, months) not in self.history:
+                self.history[(symbol, interval, months)] = self._history(symbol, interval, list(months))
+            history = self.history[(symbol, interval, months)]
+            self.signals[key] = STRATEGIES[self.strategy](history.copy(), self.compact, **indicator)
+        return self.signals[key]
+
+    def _bars(self, df, months):
+        # Positions [lo, hi) of the bars of consecutive months
+        times = df['Open Time'].to_numpy()
+        times = times.astype('datetime64[ms]').astype(np.int64) if np.issubdtype(times.dtype, np.datetime64) else times
+        lo = np.searchsorted(times, month_range(months[0])[0], side='left')
+        hi = np.searchsorted(times, month_range(months[-1])[1], side='right')
+        return int(lo), int(hi)
+
+    def _grid(self, symbol, interval, months, indicator, window_months, params):
+        df = self._signals(symbol, interval, months, indicator)
+        lo, hi = self._bars(df, window_months)
+        key = (symbol, interval, months, tuple(sorted(indicator.items())), lo, hi, tuple((p['take'], p['stop']) for p in params))
+        if key not in self.results:
+            self.results[key] = run_grid(df.iloc[lo:hi], self.budget, self.trade_percentage, self.leverage, params)
+        return self.results[key]
+
+    def run(self, symbol, interval, months):
+        # One row per window: the params picked in sample and how they did out of sample
+        months = tuple(sorted(months))
+        rows = []
+        for in_sample, out_of_sample in self.windows(months):
+            best = None
+            for indicator in self.indicator_params:
+                grid = self._grid(symbol, interval, months, indicator, in_sample, self.params)
+                i = int(np.argmax(grid[self.metric].to_numpy()))
+                if best is None or grid[self.metric].iloc[i] > best[2][self.metric]:
+                    best = (indicator, self.params[i], grid.iloc[i])
+            indicator, param, in_stats = best
+            out_stats = self._grid(symbol, interval, months, indicator, out_of_sample, [param]).iloc[0]
+            rows.append({
+                'symbol': symbol,
+                'in_sample': f'{in_sample[0]}..{in_sample[-1]}',
+                'out_of_sample': f'{out_of_sample[0]}..{out_of_sample[-1]}',
+                'indicator': indicator,
+                'take': param['take'],
+                'stop': param['stop'],
+                f'in_sample_{self.metric}': in_stats[self.metric],
+                'out_of_sample_end_budget': out_stats['end_budget'],
+                'out_of_sample_result_percentage': out_stats['final_result_percentage'],
+                'out_of_sample_trades': int(out_stats['amount_trades']),
+            })
+        return pd.DataFrame(rows)
+
+    def run_many(self, symbols, interval, months):
+        return pd.concat([self.run(symbol, interval, months) for symbol in symbols], ignore_index=True)
+
+    @staticmethod
+    def compounded(result):
+        # Out-of-sample percentage of every window chained one after the other
+        return float((1 + result['out_of_sample_result_percentage'] / 100).prod() * 100 - 100)